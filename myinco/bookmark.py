@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, Value, When
+
+from isghome.models import (
+    OrderBookmark,
+    CustomerBookmark,
+    OrganizationBookmark,
+    UserBookmark,
+)
+
+
+"""
+즐겨찾기
+* (user, 대상) 한 쌍에 대해 get_or_create / delete 한 번으로 토글
+* 사용자별 즐겨찾기 대상 id 목록을 캐싱해서 목록 화면 is_bookmarked 에 사용
+* 토글로 변경된 경우에만 커밋 이후 캐시 삭제
+"""
+
+BOOKMARK_KEY = "myinco:bookmark:{}:{}"
+BOOKMARK_TIMEOUT = 60 * 60
+
+# 종류 : (모델, 대상 필드)
+BOOKMARK_TARGETS = {
+    "order": (OrderBookmark, "order"),
+    "customer": (CustomerBookmark, "customer"),
+    "organization": (OrganizationBookmark, "organization"),
+    "user": (UserBookmark, "target_user"),
+}
+
+
+def get_bookmark_ids(kind, user_id):
+    """user_id 가 즐겨찾기한 대상 id set"""
+    if not user_id:
+        return set()
+    key = BOOKMARK_KEY.format(kind, user_id)
+    ids = cache.get(key)
+    if ids is None:
+        model, field = BOOKMARK_TARGETS[kind]
+        ids = set(
+            model.objects.filter(user_id=user_id).values_list(
+                f"{field}_id", flat=True
+            )
+        )
+        cache.set(key, ids, BOOKMARK_TIMEOUT)
+    return ids
+
+
+def invalidate_bookmark_ids(kind, user_id):
+    key = BOOKMARK_KEY.format(kind, user_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def toggle_bookmark(kind, user_id, target_id, add):
+    """
+    즐겨찾기 추가(add=True) / 삭제, 실제로 변경된 경우 True
+    * 이미 추가/삭제된 상태면 False
+    """
+    model, field = BOOKMARK_TARGETS[kind]
+    lookup = {"user_id": user_id, f"{field}_id": target_id}
+    if add:
+        changed = model.objects.get_or_create(**lookup)[1]
+    else:
+        changed = model.objects.filter(**lookup).delete()[0] > 0
+    if changed:
+        invalidate_bookmark_ids(kind, user_id)
+    return changed
+
+
+def annotate_bookmarked(queryset, kind, user_id, field="id"):
+    """
+    queryset 에 is_bookmarked 추가
+    * field : 즐겨찾기 대상 id 와 비교할 필드 (UserProfile 은 user_id)
+    """
+    ids = get_bookmark_ids(kind, user_id)
+    if not ids:
+        return queryset.annotate(
+            is_bookmarked=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_bookmarked=Case(
+            When(**{f"{field}__in": ids}, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+    )
@@ -0,0 +1,71 @@
+import uuid
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from isghome.models import ServicePolicy, ServicePolicyPriceOption
+
+
+"""
+서비스 가격 옵션 카탈로그 캐시
+* 프로세스 내부에 상품별로 묶은 가격 옵션을 보관
+* 버전 토큰은 공용 캐시에 두고, 토큰이 바뀌면 각 프로세스가 다시 빌드
+* 정책/가격 옵션 저장·삭제 시 커밋 이후 토큰 갱신
+"""
+
+CATALOG_VERSION_KEY = "myinco:catalog:version"
+
+_catalog = {"version": None, "data": None}
+_catalog_lock = threading.Lock()
+
+
+class Catalog:
+    def __init__(self, options):
+        self.options = options
+        self.active_options = [
+            option for option in options if option.policy.is_active
+        ]
+        self.by_product = {}
+        for option in options:
+            self.by_product.setdefault(option.product_name, []).append(option)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    transaction.on_commit(
+        lambda: cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+    )
+
+
+def get_catalog():
+    version = get_catalog_version()
+    if _catalog["version"] == version and _catalog["data"] is not None:
+        return _catalog["data"]
+    with _catalog_lock:
+        if _catalog["version"] != version or _catalog["data"] is None:
+            options = list(
+                ServicePolicyPriceOption.objects.select_related(
+                    "policy", "product"
+                ).order_by("id")
+            )
+            _catalog["data"] = Catalog(options)
+            _catalog["version"] = version
+    return _catalog["data"]
+
+
+@receiver(post_save, sender=ServicePolicy)
+@receiver(post_delete, sender=ServicePolicy)
+@receiver(post_save, sender=ServicePolicyPriceOption)
+@receiver(post_delete, sender=ServicePolicyPriceOption)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    invalidate_catalog()
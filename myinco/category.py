@@ -1,9 +1,17 @@
+import re
 import json
+import uuid
+import hashlib
+import operator
+from decimal import Decimal, InvalidOperation
 import pandas as pd
 import numpy as np
 
 from django import forms
 from django.db import transaction
+from django.db.models import signals
+from django.dispatch import receiver
+from django.core.cache import cache
 from django.views.generic import (
     ListView,
     DetailView,
@@ -25,6 +33,7 @@ from isghome.models import (
 )
 # from isghome.views import URLArgument
 from isghome.utils import MyIncoCodeValidator
+from isghome.views.myinco.catalog import invalidate_catalog
 
 
 """
@@ -69,6 +78,299 @@ from isghome.utils import MyIncoCodeValidator
 ['{product_name}', '{라이센스 타입}', '{사용자수}', '{라이센스 기간}', '{라이센스 정책}']
 """
 
+# 컬럼 단위 포함 여부 검사: str_contains(haystacks, needles)
+str_contains = np.frompyfunc(operator.contains, 2, 1)
+
+
+RULE_VARIABLE_PATTERN = re.compile(r"\{([^{}]+)\}")
+CODE_SET_KEY = "myinco:policy:code-set:{}:{}:{}:{}:{}"
+CODE_SET_GENERATION_KEY = "myinco:policy:code-set-generation:{}"
+CODE_SET_TIMEOUT = 60 * 60 * 24
+
+
+def check_rule_syntax(rule):
+    """
+    {변수} 규칙 형식 검사
+    * 중괄호는 열고 닫는 짝이 맞아야 하며 중첩/빈 변수는 허용하지 않음
+    """
+    remains = RULE_VARIABLE_PATTERN.sub("", rule)
+    return "{" not in remains and "}" not in remains
+
+
+def get_code_set_generation(policy_id):
+    """
+    정책별 코드 셋 캐시 토큰
+    * 토큰이 만료/삭제된 경우 새 토큰을 만들어 이전 캐시를 재사용하지 않음
+    """
+    key = CODE_SET_GENERATION_KEY.format(policy_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_code_set(policy_id):
+    key = CODE_SET_GENERATION_KEY.format(policy_id)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def get_available_code_set(policy, product):
+    """
+    정책/상품별 생성 가능한 {서비스 코드: 서비스 설명} 캐시 조회
+    * (정책, 상품, 정책 버전, 규칙) 단위로 캐싱
+    * 옵션 그룹/코드가 바뀌면 정책 generation 토큰을 바꿔 무효화
+    """
+    rule_digest = hashlib.md5(
+        f"{policy.desc_rule}\n{policy.code_rule}".encode("utf-8")
+    ).hexdigest()
+    key = CODE_SET_KEY.format(
+        policy.id,
+        product.id,
+        policy.version,
+        rule_digest,
+        get_code_set_generation(policy.id),
+    )
+    candidates = cache.get(key)
+    if candidates is None:
+        validator = MyIncoCodeValidator()
+        candidates = validator.get_available_code_set(policy, product)
+        cache.set(key, candidates, CODE_SET_TIMEOUT)
+    return candidates
+
+
+@receiver(signals.post_save, sender=ServicePolicy)
+@receiver(signals.post_delete, sender=ServicePolicy)
+def invalidate_policy_code_set(sender, instance, **kwargs):
+    invalidate_code_set(instance.id)
+
+
+@receiver(signals.post_save, sender=ServicePolicyGroupCode)
+@receiver(signals.post_delete, sender=ServicePolicyGroupCode)
+def invalidate_group_code_set(sender, instance, **kwargs):
+    invalidate_code_set(instance.policy_id)
+
+
+@receiver(signals.post_save, sender=ServicePolicyCode)
+@receiver(signals.post_delete, sender=ServicePolicyCode)
+def invalidate_policy_code_code_set(sender, instance, **kwargs):
+    policy_id = ServicePolicyGroupCode.objects.filter(
+        id=instance.group_code_id).values_list("policy_id", flat=True).first()
+    if policy_id:
+        invalidate_code_set(policy_id)
+
+
+PRICE_OPTION_CODE_FIELDS = ["service_code", "service_description"]
+POLICY_RULE_FIELDS = ("desc_rule", "code_rule", "version")
+
+
+def sync_price_option_codes(price_options, batch_size=500):
+    """
+    ServicePolicyPriceOption 의 service_code / service_description 컬럼을
+    규칙/옵션 기준 계산값으로 갱신, 변경된 건수 반환
+    """
+    price_options = price_options.select_related(
+        "policy").prefetch_related("options__group_code")
+    changed = []
+    for price_option in price_options:
+        service_code = price_option.get_service_code()
+        service_description = price_option.get_service_description()
+        if (
+            price_option.service_code == service_code
+            and price_option.service_description == service_description
+        ):
+            continue
+        price_option.service_code = service_code
+        price_option.service_description = service_description
+        changed.append(price_option)
+    ServicePolicyPriceOption.objects.bulk_update(
+        changed, PRICE_OPTION_CODE_FIELDS, batch_size=batch_size)
+    if changed:
+        invalidate_catalog()
+    return len(changed)
+
+
+def backfill_price_option_codes(policy_ids=None, batch_size=500):
+    """
+    저장된 서비스 코드/설명 일괄 재계산 (정책 단위 트랜잭션)
+    * policy_ids 미지정 시 전체 정책 대상
+    """
+    policies = ServicePolicy.objects.order_by("id")
+    if policy_ids:
+        policies = policies.filter(id__in=policy_ids)
+    count = 0
+    for policy_id in policies.values_list("id", flat=True):
+        with transaction.atomic():
+            count += sync_price_option_codes(
+                ServicePolicyPriceOption.objects.filter(policy_id=policy_id),
+                batch_size=batch_size,
+            )
+    return count
+
+
+def sync_price_option_codes_on_commit(**filters):
+    transaction.on_commit(
+        lambda: sync_price_option_codes(
+            ServicePolicyPriceOption.objects.filter(**filters)))
+
+
+@receiver(signals.pre_save, sender=ServicePolicy)
+def remember_policy_rules(sender, instance, **kwargs):
+    instance._rule_snapshot = (
+        ServicePolicy.objects.filter(id=instance.id).values_list(
+            *POLICY_RULE_FIELDS).first()
+        if instance.id else None
+    )
+
+
+@receiver(signals.post_save, sender=ServicePolicy)
+def sync_policy_price_option_codes(sender, instance, created, **kwargs):
+    snapshot = getattr(instance, "_rule_snapshot", None)
+    current = tuple(getattr(instance, field) for field in POLICY_RULE_FIELDS)
+    if created or snapshot is None or snapshot == current:
+        return
+    sync_price_option_codes_on_commit(policy_id=instance.id)
+
+
+@receiver(signals.post_save, sender=ServicePolicyGroupCode)
+def sync_group_code_price_option_codes(sender, instance, created, **kwargs):
+    if not created:
+        sync_price_option_codes_on_commit(
+            options__group_code_id=instance.id)
+
+
+@receiver(signals.post_save, sender=ServicePolicyCode)
+def sync_code_price_option_codes(sender, instance, created, **kwargs):
+    if not created:
+        sync_price_option_codes_on_commit(options__id=instance.id)
+
+
+@receiver(
+    signals.m2m_changed, sender=ServicePolicyPriceOption.options.through)
+def sync_price_option_options(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        sync_price_option_codes_on_commit(options__id=instance.id)
+    else:
+        sync_price_option_codes_on_commit(id=instance.id)
+
+
+HOMEPAGE_POLICY_KEY = "myinco:policy:homepage:{}"
+
+
+def get_active_homepage_policy_id(category_id):
+    """
+    카테고리별 홈페이지 노출 정책 id (없으면 None)
+    """
+    key = HOMEPAGE_POLICY_KEY.format(category_id)
+    policy_id = cache.get(key)
+    if policy_id is None:
+        policy_id = ServicePolicy.objects.filter(
+            category_id=category_id, is_active_homepage=True,
+        ).order_by("-ctime").values_list("id", flat=True).first() or 0
+        cache.set(key, policy_id, None)
+    return policy_id or None
+
+
+def invalidate_active_homepage_policy(category_id):
+    transaction.on_commit(
+        lambda: cache.delete(HOMEPAGE_POLICY_KEY.format(category_id)))
+
+
+def lock_homepage_category(category_id):
+    """
+    홈페이지 노출 정책 변경 전 카테고리 row 잠금
+    * 정책 저장(ServicePolicy row 잠금)보다 먼저 호출해서 잠금 순서를 맞춤
+    """
+    ProductCategory.objects.select_for_update().filter(
+        id=category_id).values_list("id", flat=True).first()
+
+
+def set_active_homepage_policy(policy):
+    """
+    정책을 카테고리의 유일한 홈페이지 노출 정책으로 지정
+    * 카테고리 row 만 잠그고, 플래그가 실제로 다른 정책만 갱신
+    * 같은 트랜잭션에서 lock_homepage_category 를 먼저 호출한 뒤 정책 저장
+    """
+    lock_homepage_category(policy.category_id)
+    others = ServicePolicy.objects.filter(
+        category_id=policy.category_id, is_active_homepage=True,
+    ).exclude(id=policy.id)
+    changed = others.update(is_active_homepage=False)
+    changed += ServicePolicy.objects.filter(
+        id=policy.id, is_active_homepage=False,
+    ).update(is_active_homepage=True)
+    policy.is_active_homepage = True
+    if changed:
+        invalidate_active_homepage_policy(policy.category_id)
+    return changed
+
+
+@receiver(signals.post_save, sender=ServicePolicy)
+@receiver(signals.post_delete, sender=ServicePolicy)
+def invalidate_homepage_policy(sender, instance, **kwargs):
+    invalidate_active_homepage_policy(instance.category_id)
+
+
+def get_existing_product_names(product_names):
+    return set(
+        Product.objects.filter(
+            product_name__in=list(product_names)
+        ).values_list("product_name", flat=True)
+    )
+
+
+def bulk_create_group_codes(policy, group_options):
+    """
+    옵션 그룹/옵션 코드 일괄 생성
+    * group_options : [(그룹명, [옵션값, ...]), ...]
+    """
+    ServicePolicyGroupCode.objects.bulk_create([
+        ServicePolicyGroupCode(
+            policy=policy, name=gc_name, display_order=i + 1)
+        for i, (gc_name, values) in enumerate(group_options)
+    ])
+    group_code_map = {
+        group_code.name: group_code
+        for group_code in ServicePolicyGroupCode.objects.filter(policy=policy)
+    }
+    ServicePolicyCode.objects.bulk_create([
+        ServicePolicyCode(
+            group_code=group_code_map[gc_name], name=value,
+            display_order=i + 1)
+        for gc_name, values in group_options
+        for i, value in enumerate(values)
+    ])
+
+
+def get_policy_code_map(policy):
+    """{(그룹명, 옵션명): ServicePolicyCode.id}"""
+    codes = ServicePolicyCode.objects.filter(
+        group_code__policy=policy).values_list(
+            "id", "group_code__name", "name")
+    return {
+        (gc_name, str(name)): code_id for code_id, gc_name, name in codes
+    }
+
+
+def bulk_add_price_option_codes(option_codes):
+    """
+    ServicePolicyPriceOption.options m2m 일괄 추가
+    * option_codes : [(price_option_id, code_id), ...]
+    """
+    field = ServicePolicyPriceOption._meta.get_field("options")
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    through.objects.bulk_create(
+        [
+            through(**{f"{source}_id": po_id, f"{target}_id": code_id})
+            for po_id, code_id in option_codes
+        ],
+        ignore_conflicts=True,
+    )
+
 
 class MyincoAdminCategoryListView(ListView):
     template_name = "myinco_admin/category/list.html"
@@ -253,17 +555,29 @@ class MyincoAdminServicePolicyDetailView(DetailView):
 
 class MyincoAdminServicePolicyOptionInfoView(DetailView):
     model = ServicePolicy
+    # 행 범위 조회 최대 행 수
+    max_limit = 1000
 
     def get(self, request, *args, **kwargs):
+        try:
+            start = int(request.GET.get("start") or 0)
+            limit = request.GET.get("limit")
+            limit = min(int(limit), self.max_limit) if limit else None
+        except ValueError:
+            start = limit = -1
+        if start < 0 or (limit is not None and limit <= 0):
+            return JsonResponse(
+                {"data": "잘못된 조회 조건입니다.", "is_success": False},
+                status=400,
+            )
         self.object = self.get_object()
-        data = self.get_data()
+        data = self.get_data(start, limit)
         # context = self.get_context_data(object=self.object)
-        print('data:', data)
         return JsonResponse({
                 "data": data,
                 "is_success": True})
 
-    def get_data(self):
+    def get_data(self, start=0, limit=None):
         data = {
             "id": self.object.id,
             "version": self.object.version,
@@ -275,25 +589,36 @@ class MyincoAdminServicePolicyOptionInfoView(DetailView):
             "ctime": f'{self.object.ctime.strftime("%Y년 %m월 %d일")}·생성됨',
         }
 
-        option_set = self.object.servicepolicypriceoption_set.all()
+        option_set = self.object.servicepolicypriceoption_set.order_by(
+            "id").prefetch_related("options__group_code")
         product_id = self.request.GET.get("product")
         if product_id:
-            product = Product.objects.get(id=product_id)
-            option_set = option_set.filter(product=product)
+            option_set = option_set.filter(product_id=product_id)
+
+        # 행 범위 단위 조회: ?start=0&limit=500 (limit 최대 max_limit)
+        if limit:
+            data["total"] = option_set.count()
+            option_set = option_set[start:start + limit]
+            next_start = start + limit
+            data["next_start"] = (
+                next_start if next_start < data["total"] else None)
+        else:
+            start = 0
 
         options = [
             # ["연번", "생성 코드", "서비스 설명", "즉시 구매", "단가(₩)"],
         ]
         meta = {}
-        for i, po in enumerate(option_set):
-            no = str(i+1)
-            service_code = po.get_service_code()
-            service_description = po.get_service_description()
-            price = po.price
+        for i, po in enumerate(option_set, start=start + 1):
+            no = str(i)
+            # 저장된 코드/설명을 우선 사용, 비어있는 경우에만 옵션으로 계산
+            service_code = po.service_code or po.get_service_code()
+            service_description = (
+                po.service_description or po.get_service_description())
             options.append([
                 no, service_code, service_description,
-                po.is_buy_now, price])
-            meta[f'A{i+1}'] = {'pk': po.pk}
+                po.is_buy_now, po.price])
+            meta[f'A{i}'] = {'pk': po.pk}
 
         data["data"] = options
         data["meta"] = meta
@@ -327,9 +652,6 @@ class MyincoAdminServicePolicyBatchTestView(View):
         )
 
     def get_verified_data(self, upload_file):
-        data, errors = [], []
-        meta, code_dict, info_dict = {}, {}, {}
-
         rule_df = pd.read_excel(
                 upload_file, sheet_name="system-rule",
                 header=None, index_col=0).transpose()
@@ -337,63 +659,60 @@ class MyincoAdminServicePolicyBatchTestView(View):
         desc_rule = rule_df["콘텐츠 설명 규칙"][1]
         code_rule = rule_df["코드 생성 규칙"][1]
         df = pd.read_excel(upload_file, sheet_name="version")
-        df = df.replace(np.nan, "")
+        df = df.replace(np.nan, "").reset_index(drop=True)
         columns = list(df.columns)
         start = columns.index("대표코드")
         end = columns.index("단가")
-        groupcode_index = df.columns[start + 1 : end]  # noqa
-        for i, gc_name in enumerate(groupcode_index):
-            values = list(df[gc_name].drop_duplicates().values)
-            code_dict[gc_name] = values
+        groupcode_index = list(df.columns[start + 1 : end])  # noqa
+        code_dict = {
+            gc_name: list(df[gc_name].drop_duplicates().values)
+            for gc_name in groupcode_index
+        }
 
-        vc_normal = 0
-        vc_error = 0
-        vc_all = 0
-        for i, row in df.iterrows():
-            is_valid = True
-            no = row["번호"]
-            no = str(no)
-            # category = row['제품군']
-            service_code = row["서비스 코드(함수적용)"]
-            # service_code = row["서비스 코드(함수적용)"].strip()
-            product_name = row["서비스명"].strip()
-            print(product_name)
-            try:
-                Product.objects.get(product_name=product_name)
-            except Product.DoesNotExist:
-                print('Product.DoesNotExist!!', product_name)
+        # 행 단위 반복 대신 컬럼 단위로 검증
+        nos = df["번호"].astype(str)
+        product_names = df["서비스명"].astype(str).str.strip()
+        descriptions = df["콘텐츠 설명"].astype(str).str.strip()
+
+        existing_names = get_existing_product_names(product_names.unique())
+        product_error = (~product_names.isin(existing_names)).values
+        desc_error = ~str_contains(
+            descriptions.values, product_names.values).astype(bool)
+        keyword_error = np.zeros(len(df), dtype=bool)
+        for gc_name in groupcode_index:
+            keywords = df[gc_name].astype(str).values
+            keyword_error |= (keywords != "") & ~str_contains(
+                descriptions.values, keywords).astype(bool)
+
+        errors, meta = [], {}
+        invalid = product_error | desc_error | keyword_error
+        for i in np.flatnonzero(invalid):
+            if product_error[i]:
                 errors.append(f"B{i+1}")
                 meta[f"B{i+1}"] = {"is_valid": False}
-                is_valid = False
-            # representative_code = row['대표 코드']
-            price = row["단가"]
-            # version = row['버전']
-            service_description = row["콘텐츠 설명"].strip()
-            if product_name not in service_description:
+            if desc_error[i]:
                 errors.append(f"D{i+1}")
+            if desc_error[i] or keyword_error[i]:
                 meta[f"D{i+1}"] = {"is_valid": False}
-                is_valid = False
-            for gc_name in groupcode_index:
-                keyword = row[gc_name]
-                print('keyword:', keyword, '||')
-                if no in info_dict:
-                    info_dict[no].update({gc_name: keyword})
-                else:
-                    info_dict[no] = {gc_name: keyword}
-                if keyword and keyword not in service_description:
-                    meta[f"D{i+1}"] = {"is_valid": False}
-                    is_valid = False
-            data.append(
-                [no, product_name, service_code, service_description, price]
+
+        info_dict = {}
+        for no, info in zip(nos, df[groupcode_index].to_dict("records")):
+            info_dict.setdefault(no, {}).update(info)
+
+        data = [
+            list(record) for record in zip(
+                nos,
+                product_names,
+                df["서비스 코드(함수적용)"].tolist(),
+                descriptions,
+                df["단가"].tolist(),
             )
-            if is_valid:
-                vc_normal += 1
-            else:
-                vc_error += 1
-            vc_all += 1
+        ]
+        vc_all = len(df)
+        vc_error = int(invalid.sum())
         count_dict = {
             "vc_all": vc_all,
-            "vc_normal": vc_normal,
+            "vc_normal": vc_all - vc_error,
             "vc_error": vc_error,
         }
         # data.insert(0, self.sp_header)
@@ -421,15 +740,14 @@ class MyincoAdminServicePolicyBatchVerifyView(View):
         vc_normal = 0
         vc_error = 0
         vc_all = 0
+        existing_names = get_existing_product_names(
+            record[1] for record in data)
         for i, record in enumerate(data):
             is_valid = True
             no, product_name, service_code, service_description, price = record
             if no == "연번":
                 continue
-            try:
-                Product.objects.get(product_name=product_name)
-            except Product.DoesNotExist:
-                print('Product.DoesNotExist', product_name)
+            if product_name not in existing_names:
                 errors.append(f"B{i+1}")
                 meta[f"B{i+1}"] = {"is_valid": False}
             if product_name not in service_description:
@@ -474,14 +792,14 @@ class MyincoAdminServicePolicyEachVerifyView(View):
         vc_normal = 0
         vc_error = 0
         vc_all = 0
+        existing_names = get_existing_product_names(
+            record[1] for record in data)
         for i, record in enumerate(data):
             is_valid = True
             no, product_name, service_code, service_description, price = record
             if no == "연번":
                 continue
-            try:
-                Product.objects.get(product_name=product_name)
-            except Product.DoesNotExist:
+            if product_name not in existing_names:
                 errors.append(f"B{i+1}")
                 meta[f"B{i+1}"] = {"is_valid": False}
             if product_name not in service_description:
@@ -545,9 +863,7 @@ class MyincoAdminServicePolicyServiceVerifyView(View):
         vc_normal = 0
         vc_error = 0
         vc_all = 0
-        validator = MyIncoCodeValidator()
-        candidates = validator.get_available_code_set(
-                                    self.policy, self.product)
+        candidates = get_available_code_set(self.policy, self.product)
         for i, record in enumerate(data):
             is_valid = True
             no, service_code, service_description, is_buy_now, price = record
@@ -714,61 +1030,57 @@ class MyincoAdminServicePolicyBatchCreateView(CreateView):
     @transaction.atomic
     def form_valid(self, form):
         """If the form is valid, save the associated model."""
-        print("data!!:", form.cleaned_data)
-        self.object = form.save()
-        if self.object.is_active_homepage is True:
-            ServicePolicy.objects.filter(
-                category=self.object.category,
-            ).update(is_active_homepage=False)
-            self.object.is_active_homepage = True
-            self.object.save()
         data = form.cleaned_data
         code_dict = data["meta"]["CODE"]
         info_dict = data["meta"]["INFO"]
         rule_dict = data["meta"]["RULE"]
+        if form.instance.is_active_homepage is True:
+            lock_homepage_category(form.instance.category_id)
+        self.object = form.save(commit=False)
         self.object.desc_rule = rule_dict["desc_rule"]
         self.object.code_rule = rule_dict["code_rule"]
         self.object.save()
-        for i, gc_name in enumerate(code_dict):
-            values = code_dict[gc_name]
-            group_code = ServicePolicyGroupCode.objects.create(
+        form.save_m2m()
+        if self.object.is_active_homepage is True:
+            set_active_homepage_policy(self.object)
+
+        bulk_create_group_codes(self.object, list(code_dict.items()))
+        code_map = get_policy_code_map(self.object)
+
+        records = [
+            record for record in data["data"]
+            if record[0] != "연번" and record[1]
+        ]
+        products = {
+            product.product_name: product
+            for product in Product.objects.filter(
+                product_name__in={record[1] for record in records})
+        }
+        price_options = ServicePolicyPriceOption.objects.bulk_create([
+            ServicePolicyPriceOption(
                 policy=self.object,
-                name=gc_name,
-                display_order=i + 1,
+                product=products[record[1]],
+                product_name=record[1],
+                service_code=record[2],
+                service_description=record[3],
+                price=record[4],
             )
-            for i, value in enumerate(values):
-                code = ServicePolicyCode.objects.create(
-                    group_code=group_code,
-                    name=value,
-                    display_order=i + 1,
-                )
-        for record in data["data"]:
+            for record in records
+        ])
+        # bulk_create 가 pk 를 돌려주지 않는 DB 인 경우 생성 순서로 다시 조회
+        if price_options and price_options[0].pk is None:
+            price_options = list(
+                ServicePolicyPriceOption.objects.filter(
+                    policy=self.object).order_by("id"))
+
+        option_codes = []
+        for price_option, record in zip(price_options, records):
             no = record[0]
-            if no == "연번":
-                continue
-            product_name = record[1]
-            service_code = record[2]
-            service_description = record[3]
-            price = record[4]
-            if not product_name:
-                continue
-            product = Product.objects.get(product_name=product_name)
-            price_option = ServicePolicyPriceOption.objects.create(
-                policy=self.object,
-                product=product,
-                product_name=product_name,
-                service_code=service_code,
-                service_description=service_description,
-                price=price,
-            )
             for gc_name, code_name in info_dict[no].items():
-                group_code = ServicePolicyGroupCode.objects.get(
-                    policy=self.object, name=gc_name
-                )
-                code = ServicePolicyCode.objects.get(
-                    group_code=group_code, name=code_name
-                )
-                price_option.options.add(code)
+                option_codes.append(
+                    (price_option.pk, code_map[(gc_name, str(code_name))]))
+        bulk_add_price_option_codes(option_codes)
+        invalidate_catalog()
         return JsonResponse({"is_success": True})
 
     def form_invalid(self, form):
@@ -878,39 +1190,10 @@ class ServicePolicyEachCreateForm(forms.ModelForm):
             is_active_homepage = False
         return is_active_homepage
 
-    def check_rule_syntax(self, rule):
-        isValid = True
-        # {, } 카운트 체크
-        # 열었으면 닫아야 한다 체크
-        if rule.count('{') != rule.count('}'):
-            isValid = False
-        else:
-            is_opened = False
-            count = 0
-            for char in rule:
-                print(is_opened, count)
-                if char == '{':
-                    if is_opened:
-                        isValid = False
-                        break
-                    is_opened = True
-                elif char == '}':
-                    if not is_opened:
-                        isValid = False
-                        break
-                    if count == 0:
-                        isValid = False
-                        break
-                    is_opened = False
-                    count = 0
-                elif is_opened is True:
-                    count += 1
-        return isValid
-
     def clean_desc_rule(self):
         desc_rule = self.cleaned_data["desc_rule"]
         if desc_rule:
-            isValid = self.check_rule_syntax(desc_rule)
+            isValid = check_rule_syntax(desc_rule)
             if not isValid:
                 raise forms.ValidationError(
                     "콘텐츠 설명 규칙의 형식이 잘못되었습니다.")
@@ -919,7 +1202,7 @@ class ServicePolicyEachCreateForm(forms.ModelForm):
     def clean_code_rule(self):
         code_rule = self.cleaned_data["code_rule"]
         if code_rule:
-            isValid = self.check_rule_syntax(code_rule)
+            isValid = check_rule_syntax(code_rule)
             if not isValid:
                 raise forms.ValidationError(
                     "코드 생성 규칙의 형식이 잘못되었습니다.")
@@ -977,30 +1260,21 @@ class MyincoAdminServicePolicyEachCreateView(CreateView):
     def form_valid(self, form):
         """If the form is valid, save the associated model."""
         print("data!!:", form.cleaned_data)
+        if form.instance.is_active_homepage is True:
+            lock_homepage_category(form.instance.category_id)
         self.object = form.save()
         if self.object.is_active_homepage is True:
-            ServicePolicy.objects.filter(
-                category=self.object.category,
-            ).update(is_active_homepage=False)
-            self.object.is_active_homepage = True
-            self.object.save()
+            set_active_homepage_policy(self.object)
         data = form.cleaned_data
 
-        for i, options in enumerate(data['code_options']):
-            print(options)
-            gc_name = options["option_name"]
-            group_code = ServicePolicyGroupCode.objects.create(
-                policy=self.object,
-                name=gc_name,
-                display_order=i + 1,
+        group_options = [
+            (
+                options["option_name"],
+                [value.strip() for value in options["option_value"].split(';')],
             )
-            for i, value in enumerate(options["option_value"].split(';')):
-                value = value.strip()
-                code = ServicePolicyCode.objects.create(
-                    group_code=group_code,
-                    name=value,
-                    display_order=i + 1,
-                )
+            for options in data['code_options']
+        ]
+        bulk_create_group_codes(self.object, group_options)
         return JsonResponse({"is_success": True})
 
     def form_invalid(self, form):
@@ -1070,13 +1344,11 @@ class MyincoAdminServicePolicyUpdateView(UpdateView):
         """If the form is valid, save the associated model."""
         print("data!!:", form.cleaned_data)
         """How to know ? value changed..."""
+        if form.instance.is_active_homepage is True:
+            lock_homepage_category(form.instance.category_id)
         self.object = form.save()
         if self.object.is_active_homepage is True:
-            ServicePolicy.objects.filter(
-                category=self.object.category,
-            ).update(is_active_homepage=False)
-            self.object.is_active_homepage = True
-            self.object.save()
+            set_active_homepage_policy(self.object)
         return JsonResponse({"is_success": True})
 
     def form_invalid(self, form):
@@ -1139,39 +1411,10 @@ class ServicePolicyServiceUpdateForm(forms.ModelForm):
             is_active_homepage = False
         return is_active_homepage
 
-    def check_rule_syntax(self, rule):
-        isValid = True
-        # {, } 카운트 체크
-        # 열었으면 닫아야 한다 체크
-        if rule.count('{') != rule.count('}'):
-            isValid = False
-        else:
-            is_opened = False
-            count = 0
-            for char in rule:
-                print(is_opened, count)
-                if char == '{':
-                    if is_opened:
-                        isValid = False
-                        break
-                    is_opened = True
-                elif char == '}':
-                    if not is_opened:
-                        isValid = False
-                        break
-                    if count == 0:
-                        isValid = False
-                        break
-                    is_opened = False
-                    count = 0
-                elif is_opened is True:
-                    count += 1
-        return isValid
-
     def clean_desc_rule(self):
         desc_rule = self.cleaned_data["desc_rule"]
         if desc_rule:
-            isValid = self.check_rule_syntax(desc_rule)
+            isValid = check_rule_syntax(desc_rule)
             if not isValid:
                 raise forms.ValidationError(
                     "콘텐츠 설명 규칙의 형식이 잘못되었습니다.")
@@ -1180,7 +1423,7 @@ class ServicePolicyServiceUpdateForm(forms.ModelForm):
     def clean_code_rule(self):
         code_rule = self.cleaned_data["code_rule"]
         if code_rule:
-            isValid = self.check_rule_syntax(code_rule)
+            isValid = check_rule_syntax(code_rule)
             if not isValid:
                 raise forms.ValidationError(
                     "코드 생성 규칙의 형식이 잘못되었습니다.")
@@ -1211,136 +1454,195 @@ class ServicePolicyServiceUpdateForm(forms.ModelForm):
         ]
 
 
-class MyincoAdminServicePolicyServiceUpdateView(UpdateView):
-    model = ServicePolicy
-    form_class = ServicePolicyServiceUpdateForm
-    template_name = "myinco_admin/category/policy_create.html"
+def is_true_value(value):
+    return value in (True, 1, "1", "true", "True")
+
+
+def get_referenced_ids(model, ids):
+    """
+    ids 중 다른 모델(FK, M2M)이 참조하고 있는 id set
+    * model 을 가리키는 모든 역참조 관계를 확인
+    """
+    referenced_ids = set()
+    if not ids:
+        return referenced_ids
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            through = relation.through
+            field_name = relation.field.m2m_reverse_field_name()
+        else:
+            through = relation.related_model
+            field_name = relation.field.name
+        referenced_ids.update(
+            through._base_manager.filter(
+                **{f"{field_name}__in": ids}
+            ).values_list(f"{field_name}_id", flat=True))
+    return referenced_ids
+
+
+class PriceGridError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(" / ".join(errors))
+
+
+class ServicePolicyGridSyncMixin:
+    """
+    가격 그리드 변경분 반영
+    * 기존 가격 옵션과 service_code 기준으로 비교해 추가/수정/삭제만 수행
+    * 다른 모델이 참조하는 가격 옵션(주문 서비스, 사용자 서비스 등)은 삭제하지 않음
+    """
 
     def post(self, request, *args, **kwargs):
         """
         Handle POST requests: instantiate a form instance with the passed
         POST variables and then check if it's valid.
         """
-        print('request.POST:', request.POST)
         form = self.get_form()
         if form.is_valid():
-            print(' == form is_valid')
             return self.form_valid(form)
         else:
-            print(' == form is_invalid!!!!!!!!!!')
             return self.form_invalid(form)
 
-    @transaction.atomic
-    def form_valid(self, form):
-        """If the form is valid, save the associated model."""
-        print("data!!:", form.cleaned_data)
-        # self.object = form.save()
-        self.object = self.get_object()
-        self.product = Product.objects.get(id=self.request.POST.get('product_id'))
-        if self.object.is_active_homepage is True:
-            ServicePolicy.objects.filter(
-                category=self.object.category,
-            ).update(is_active_homepage=False)
-            self.object.is_active_homepage = True
-            self.object.save()
-        data = form.cleaned_data
-
-        for record in data["data"]:
-            no, service_code, service_description, is_buy_now, price = record
-            if no == "연번":
+    def sync_price_grid(self, records, info_dict):
+        """
+        변경분 반영 후 {"created", "updated", "deleted", "skipped"} 반환
+        * 같은 service_code 의 기존 옵션이 여러 개면 id 순으로 하나씩 대응,
+          남는 옵션은 삭제 대상
+        * 단가, 옵션명 오류는 저장 전에 PriceGridError
+        """
+        existing = {}
+        for price_option in self.object.servicepolicypriceoption_set.filter(
+                product=self.product).order_by("id"):
+            existing.setdefault(price_option.service_code, []).append(
+                price_option)
+        errors = []
+        created = []
+        created_nos = []
+        updated = []
+        for record in records:
+            no, service_code, service_description, is_buy_now, price = (
+                record[:5])
+            if no == "연번" or not service_code:
                 continue
-            """
-            if ServicePolicyPriceOption.objects.filter(service_code=service_code).exists():
-                price_option = ServicePolicyPriceOption.objects.get(service_code=service_code)
-            else:
-                price_option = ServicePolicyPriceOption.objects.create(
+            try:
+                price = Decimal(str(price).replace(",", ""))
+            except InvalidOperation:
+                errors.append(f"{no}행 단가를 확인해주세요. ({price})")
+                continue
+            is_buy_now = is_true_value(is_buy_now)
+            matched = existing.get(service_code)
+            if not matched:
+                created.append(ServicePolicyPriceOption(
                     policy=self.object,
                     product=self.product,
                     product_name=self.product.product_name,
+                    service_code=service_code,
+                    service_description=service_description,
+                    is_buy_now=is_buy_now,
                     price=price,
-                )
-            for gc_name, code_name in info_dict[no].items():
-                group_code = ServicePolicyGroupCode.objects.get(
-                    policy=self.object, name=gc_name
-                )
-                code = ServicePolicyCode.objects.get(
-                    group_code=group_code, name=code_name
-                )
-                price_option.options.add(code)
-            """
-
+                ))
+                created_nos.append(no)
+                continue
+            price_option = matched.pop(0)
+            if (
+                price_option.service_description != service_description
+                or price_option.is_buy_now != is_buy_now
+                or Decimal(price_option.price) != price
+            ):
+                price_option.service_description = service_description
+                price_option.is_buy_now = is_buy_now
+                price_option.price = price
+                updated.append(price_option)
+
+        option_codes = []
+        if info_dict:
+            code_map = get_policy_code_map(self.object)
+            for index, no in enumerate(created_nos):
+                for gc_name, code_name in info_dict.get(no, {}).items():
+                    code_id = code_map.get((gc_name, str(code_name)))
+                    if code_id is None:
+                        errors.append(
+                            f"{no}행 옵션을 찾을 수 없습니다. "
+                            f"({gc_name}: {code_name})")
+                    else:
+                        option_codes.append((index, code_id))
+        if errors:
+            raise PriceGridError(errors)
+
+        ServicePolicyPriceOption.objects.bulk_update(
+            updated, ["service_description", "is_buy_now", "price"])
+
+        created = ServicePolicyPriceOption.objects.bulk_create(created)
+        if created and created[0].pk is None:
+            created = list(
+                self.object.servicepolicypriceoption_set.filter(
+                    product=self.product,
+                    service_code__in=[po.service_code for po in created],
+                ).order_by("-id")[:len(created)])[::-1]
+        bulk_add_price_option_codes([
+            (created[index].pk, code_id) for index, code_id in option_codes
+        ])
+
+        # 대응되지 않고 남은 기존 옵션 (제외된 코드, 중복 코드)
+        removed_ids = [
+            price_option.id
+            for price_options in existing.values()
+            for price_option in price_options
+        ]
+        referenced_ids = get_referenced_ids(
+            ServicePolicyPriceOption, removed_ids)
+        deleted_ids = [
+            removed_id
+            for removed_id in removed_ids
+            if removed_id not in referenced_ids
+        ]
+        ServicePolicyPriceOption.objects.filter(id__in=deleted_ids).delete()
+
+        if created or updated or deleted_ids:
+            invalidate_catalog()
+        return {
+            "created": len(created),
+            "updated": len(updated),
+            "deleted": len(deleted_ids),
+            "skipped": len(removed_ids) - len(deleted_ids),
+        }
 
-        return JsonResponse({"is_success": True})
+    @transaction.atomic
+    def form_valid(self, form):
+        """If the form is valid, save the associated model."""
+        self.object = self.get_object()
+        self.product = Product.objects.get(
+            id=self.request.POST.get('product_id'))
+        if self.object.is_active_homepage is True:
+            set_active_homepage_policy(self.object)
+        data = form.cleaned_data
+        try:
+            count_dict = self.sync_price_grid(
+                data["data"], data["meta"].get("INFO", {}))
+        except PriceGridError as e:
+            transaction.set_rollback(True)
+            return JsonResponse(
+                {"is_success": False, "errors": e.errors}, status=400)
+        return JsonResponse({"is_success": True, "count_dict": count_dict})
 
     def form_invalid(self, form):
         print("Form.Errors:", form.errors)
         return JsonResponse({"is_success": False})
 
 
-class MyincoAdminServicePolicyServiceCreateView(CreateView):
+class MyincoAdminServicePolicyServiceUpdateView(
+        ServicePolicyGridSyncMixin, UpdateView):
     model = ServicePolicy
     form_class = ServicePolicyServiceUpdateForm
     template_name = "myinco_admin/category/policy_create.html"
 
-    def post(self, request, *args, **kwargs):
-        """
-        Handle POST requests: instantiate a form instance with the passed
-        POST variables and then check if it's valid.
-        """
-        print('request.POST:', request.POST)
-        form = self.get_form()
-        if form.is_valid():
-            print(' == form is_valid')
-            return self.form_valid(form)
-        else:
-            print(' == form is_invalid!!!!!!!!!!')
-            return self.form_invalid(form)
 
-    @transaction.atomic
-    def form_valid(self, form):
-        """If the form is valid, save the associated model."""
-        print("data!!:", form.cleaned_data)
-        # self.object = form.save()
-        self.object = self.get_object()
-        self.product = Product.objects.get(id=self.request.POST.get('product_id'))
-        if self.object.is_active_homepage is True:
-            ServicePolicy.objects.filter(
-                category=self.object.category,
-            ).update(is_active_homepage=False)
-            self.object.is_active_homepage = True
-            self.object.save()
-        data = form.cleaned_data
-
-        for record in data["data"]:
-            no, service_code, service_description, is_buy_now, price = record
-            if no == "연번":
-                continue
-            """
-            if ServicePolicyPriceOption.objects.filter(service_code=service_code).exists():
-                price_option = ServicePolicyPriceOption.objects.get(service_code=service_code)
-            else:
-                price_option = ServicePolicyPriceOption.objects.create(
-                    policy=self.object,
-                    product=self.product,
-                    product_name=self.product.product_name,
-                    price=price,
-                )
-            for gc_name, code_name in info_dict[no].items():
-                group_code = ServicePolicyGroupCode.objects.get(
-                    policy=self.object, name=gc_name
-                )
-                code = ServicePolicyCode.objects.get(
-                    group_code=group_code, name=code_name
-                )
-                price_option.options.add(code)
-            """
-
-
-        return JsonResponse({"is_success": True})
-
-    def form_invalid(self, form):
-        print("Form.Errors:", form.errors)
-        return JsonResponse({"is_success": False})
+class MyincoAdminServicePolicyServiceCreateView(
+        ServicePolicyGridSyncMixin, CreateView):
+    model = ServicePolicy
+    form_class = ServicePolicyServiceUpdateForm
+    template_name = "myinco_admin/category/policy_create.html"
 
 
 class ProductCategoryInfoView(DetailView):
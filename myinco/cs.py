@@ -23,13 +23,12 @@ from isghome.models import (
     TrialLicenseRequest,    
     ReinstallRequest,
     DownloadCenter,
-    ProductCategory,
     InstallFile,
     ManualLink,
-    Product,
 )
 from isghome.views import send_auto_email
 from isghome.utils import get_strftime
+from isghome.views.myinco.service import get_tag_list, get_category_tree
 
 
 class MyincoCustomerQuestionListView(ListView):
@@ -128,16 +127,7 @@ class MyincoFAQListView(ListView):
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         context['faq_type_set'] = FAQType.objects.all()
-        related_tags = Product.objects.exclude(
-                related_tags='').values_list(
-                        'related_tags', flat=True)
-        tag_list = []
-        for tags in related_tags:
-            if tags:
-                for t in tags.split(','):
-                    if t not in tag_list:
-                        tag_list.append(t)
-        context['tag_list'] = tag_list
+        context['tag_list'] = get_tag_list()
         return context
 
 
@@ -415,12 +405,9 @@ class MyincoDownloadCenterListView(ListView):
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        context["main_categories"] = ProductCategory.objects.filter(
-            category_type="main"
-        )
-        context["sub_categories"] = ProductCategory.objects.filter(
-            category_type="sub"
-        )
+        category_tree = get_category_tree()
+        context["main_categories"] = category_tree["main"]
+        context["sub_categories"] = category_tree["sub"]
         return context
 
 
@@ -8,17 +8,25 @@ from django.views.generic import (
 
 from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
-from django.db.models import Case, When, Q
+from django.db.models import Q
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
-from isghome.views.myinco.util import make_system_log
+from isghome.views.myinco.util import (
+    make_system_log,
+    attach_total_sales,
+    invalidate_related_sales_totals,
+)
+from isghome.views.myinco.bookmark import (
+    annotate_bookmarked,
+    toggle_bookmark,
+)
+from isghome.views.myinco.matching import get_user_candidates
 
 from isghome.models import (
     User,
     UserProfile,
     Order,
     Customer,
-    CustomerBookmark,
     CustomerLog,
     Organization,
     OrderCart,
@@ -88,23 +96,10 @@ class MyincoAdminCustomerListView(ListView, CreateView):
         #     )
         # ).distinct()
 
-        queryset = queryset.annotate(
-            is_bookmarked=Case(
-                When(
-                    customerbookmark__user__id=user_id,
-                    then=True,
-                ),
-                default=False,
-            )
+        queryset = annotate_bookmarked(
+            queryset.distinct(), "customer", user_id
         )
 
-        true_set = queryset.filter(is_bookmarked=True).distinct()
-        ids = true_set.values_list("id", flat=True)
-        false_set = (
-            queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
-        )
-        queryset = true_set | false_set
-
         if ordering:
             if isinstance(ordering, str):
                 ordering = (ordering,)
@@ -121,7 +116,7 @@ class MyincoAdminCustomerListView(ListView, CreateView):
         context_data["total_objects_count"] = objects.count()
         context_data["total_object_list"] = context_data["object_list"]
         p = Paginator(objects, 10)
-        context_data["object_list"] = p.page(1)
+        context_data["object_list"] = attach_total_sales(p.page(1))
         context_data["page"] = 1
         return context_data
 
@@ -238,22 +233,9 @@ def customer_page_ajax(request):
 
     queryset = queryset.filter(is_deleted=False)
 
-    queryset = queryset.annotate(
-        is_bookmarked=Case(
-            When(
-                customerbookmark__user__id=user_id,
-                then=True,
-            ),
-            default=False,
-        )
-    )
-
-    true_set = queryset.filter(is_bookmarked=True).distinct()
-    ids = true_set.values_list("id", flat=True)
-    false_set = (
-        queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
+    queryset = annotate_bookmarked(
+        queryset.distinct(), "customer", user_id
     )
-    queryset = true_set | false_set
 
     ordering = ("-ctime",)
     if ordering:
@@ -263,7 +245,7 @@ def customer_page_ajax(request):
 
     try:
         p = Paginator(queryset, 10)
-        queryset = p.page(int(page))
+        queryset = attach_total_sales(p.page(int(page)))
 
         context = {"object_list": queryset, "page": int(page)}
 
@@ -289,53 +271,35 @@ def customer_bookmark_ajax(request):
     customer = request.POST.get("customer")
     status = True if request.POST.get("status") == "true" else False
 
-    bookmarks = CustomerBookmark.objects.filter(
-        customer=Customer.objects.get(id=customer),
-        user=User.objects.get(id=user),
+    customer_id = Customer.objects.values_list("id", flat=True).get(
+        id=customer
     )
 
     if status:
-        if bookmarks:
+        if not toggle_bookmark("customer", user, customer_id, add=True):
             return JsonResponse({"data": "bookmark already added"}, status=200)
-        else:
-            CustomerBookmark.objects.create(
-                customer=Customer.objects.get(id=customer),
-                user=User.objects.get(id=user),
+        try:
+            CustomerLog.objects.create(
+                customer_id=customer_id,
+                diff="add bookmark",
             )
-            try:
-                CustomerLog.objects.create(
-                    customer=Customer.objects.get(id=customer),
-                    diff="add bookmark",
-                )
-                print("customer log create success!!")
-            except Exception as e:
-                print(e)
+        except Exception as e:
+            print(e)
 
-            return JsonResponse({"data": "bookmark added"}, status=200)
+        return JsonResponse({"data": "bookmark added"}, status=200)
     else:
-        if not bookmarks:
+        if not toggle_bookmark("customer", user, customer_id, add=False):
             return JsonResponse(
                 {"data": "bookmark already removed"}, status=200
             )
-        else:
-            CustomerBookmark.objects.get(
-                customer=Customer.objects.get(id=customer),
-                user=User.objects.get(id=user),
-            ).delete()
-
-            bookmarks = CustomerBookmark.objects.filter(
-                customer=Customer.objects.get(id=customer),
-                user=User.objects.get(id=user),
+        try:
+            CustomerLog.objects.create(
+                customer_id=customer_id, diff="remove bookmark"
             )
+        except Exception as e:
+            print(e)
 
-            try:
-                CustomerLog.objects.create(
-                    customer=customer, diff="remove bookmark"
-                )
-            except Exception as e:
-                print(e)
-
-            return JsonResponse({"data": "bookmark removed"}, status=200)
+        return JsonResponse({"data": "bookmark removed"}, status=200)
 
 
 def open_customer_history_modal(request):
@@ -399,14 +363,9 @@ class MyincoAdminCustomerDetailView(DetailView, UpdateView):
 
         users = UserProfile.objects.filter(is_deleted=False).order_by("-ctime")
 
-        recommend_users = []
-        for each in users:
-            if each.name == customer.name:
-                if each.phone_number == customer.phone_number:
-                    recommend_users.append(each)
-                elif each.user.email == customer.email:
-                    recommend_users.append(each)
-        data["recommends"] = recommend_users
+        data["recommends"] = get_user_candidates(
+            customer, fuzzy=self.request.GET.get("fuzzy") == "true"
+        )
 
         # profiles = users.filter(~Q(name=None))
         profiles = users.filter()
@@ -469,7 +428,14 @@ class MyincoAdminCustomerDetailView(DetailView, UpdateView):
                     request.POST["organization"] = str(organization.id)
                     request.POST._mutable = mutable
 
-            return super().post(request, *args, **kwargs)
+            # 고객사가 바뀌면 이전/현재 고객사 총매출도 변경
+            before_organization_id = self.object.organization_id
+            response = super().post(request, *args, **kwargs)
+            invalidate_related_sales_totals(
+                customer_ids=[self.object.id],
+                organization_ids=[before_organization_id],
+            )
+            return response
         elif request.POST.get("form_type") == "connect":
             customer = self.object
             before_customer = copy.deepcopy(self.object)
@@ -492,6 +458,9 @@ class MyincoAdminCustomerDetailView(DetailView, UpdateView):
                 customer.synced_user = None
                 customer.is_synced = False
                 customer.save()
+                invalidate_related_sales_totals(
+                    customer_ids=[customer.id], user_ids=[synced_user.id]
+                )
 
                 etc = [["is_synced", False]]
                 extra_content = f"{request.user.profile.name}님에 의해 {customer.name}({customer.email}) 고객, 계정({user.profile.name}, {user.username})연동취소"  # noqa
@@ -522,11 +491,19 @@ class MyincoAdminCustomerDetailView(DetailView, UpdateView):
                     before_customer.synced_user = None
                     before_customer.save()
 
+                # 이 고객에 연동돼 있던 이전 계정 총매출도 변경
+                before_user_ids = [user.id]
+                if customer.synced_user_id:
+                    before_user_ids.append(customer.synced_user_id)
                 customer.synced_user = user
                 customer.is_synced = True
                 user.profile.is_synced = True
                 user.profile.save()
                 customer.save()
+                invalidate_related_sales_totals(
+                    customer_ids={customer.id, before_customer.id},
+                    user_ids=set(before_user_ids),
+                )
 
                 etc = [["is_synced", True]]
                 if request.POST.get("method") == "recommend":
@@ -0,0 +1,363 @@
+import datetime
+
+import pandas as pd
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+from isghome.models import (
+    Order,
+    OrderCart,
+    OrderLog,
+    Payment,
+    Quotation,
+)
+
+
+"""
+매출 대시보드
+* 일 단위 집계(rollup)를 날짜별 캐시에 저장
+  * order : 생성 주문 수 (고객사, 담당자, 현재 상태)
+  * revenue : 발행 완료 결제의 주문 금액 (상품, 카테고리, 고객사, 담당자)
+  * quotation : 생성 견적서 수 (고객사, 담당자)
+  * status : 상태 변경 수 (변경 상태)
+* 담당자가 여러 명인 주문은 담당자별 행(by_manager)을 따로 두고
+  담당자 기준 조회에서만 사용 (그 외 조회에서 금액이 중복 합산되지 않도록)
+* 오늘 날짜는 짧게, 지난 날짜는 명시적으로 삭제될 때까지 캐싱
+  * 주문 저장/담당자 변경 시 주문 생성일, 결제/견적서 저장 시 생성일,
+    주문 로그 저장 시 변경일 집계 삭제 (커밋 이후)
+* 조회 요청에서는 비어있는 날짜를 최대 MAX_INLINE_ROLLUP_DAYS 일만 집계
+  * 더 남아있으면 RollupPending (재요청 시 이어서 집계)
+* 야간 작업은 rollup_days, 당일 갱신은 rollup_recent 사용
+"""
+
+DAILY_ROLLUP_KEY = "myinco:dashboard:daily:v2:{}"
+TODAY_ROLLUP_TIMEOUT = 60 * 5
+# 지난 날짜는 만료 없음 (invalidate_rollup_days 로만 삭제)
+PAST_ROLLUP_TIMEOUT = None
+# 조회 요청 한 번에 새로 집계하는 최대 일수
+MAX_INLINE_ROLLUP_DAYS = 31
+# 한 번에 조회 가능한 최대 기간 (일)
+MAX_RANGE_DAYS = 731
+FACT_COLUMNS = [
+    "date",
+    "metric",
+    "by_manager",
+    "status",
+    "product",
+    "category",
+    "organization",
+    "manager",
+    "count",
+    "amount",
+]
+DIMENSIONS = ["status", "product", "category", "organization", "manager"]
+METRICS = ["order", "revenue", "quotation", "status"]
+FREQUENCIES = {"day": "D", "week": "W-MON", "month": "MS", "year": "YS"}
+
+
+class RollupPending(Exception):
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"집계되지 않은 날짜가 {missing}일 남아있습니다.")
+
+
+def get_order_organizations(order_ids):
+    """{주문 id: 고객사명}"""
+    organizations = {}
+    for order_id, customer_org, user_org in Order.objects.filter(
+        id__in=order_ids
+    ).values_list(
+        "id",
+        "purchaser_customer__organization__place_name",
+        "purchaser_user__profile__organization__place_name",
+    ):
+        organizations[order_id] = customer_org or user_org or ""
+    return organizations
+
+
+def get_order_managers(order_ids):
+    """{주문 id: [담당자명, ...]}"""
+    field = Order._meta.get_field("manager")
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    managers = {}
+    for order_id, name in through.objects.filter(
+        **{f"{source}_id__in": order_ids}
+    ).values_list(f"{source}_id", f"{target}__profile__name"):
+        managers.setdefault(order_id, []).append(name or "")
+    return managers
+
+
+def build_daily_facts(day):
+    """
+    하루치 집계 행 목록
+    * by_manager=False : 주문당 한 행 (담당자 없음)
+    * by_manager=True : 담당자별 한 행씩 (담당자 기준 조회 전용)
+    """
+    facts = []
+    date = day.isoformat()
+
+    def add(order_id, metric, count=1, amount=0, **dims):
+        rows = [(False, "")] + [
+            (True, manager) for manager in managers.get(order_id) or [""]
+        ]
+        for by_manager, manager in rows:
+            fact = dict.fromkeys(DIMENSIONS, "")
+            fact.update(dims)
+            fact.update(
+                date=date,
+                metric=metric,
+                by_manager=by_manager,
+                organization=organizations.get(order_id, ""),
+                manager=manager,
+                count=count,
+                amount=amount,
+            )
+            facts.append(fact)
+
+    orders = list(
+        Order.objects.filter(ctime__date=day, is_deleted=False).values_list(
+            "id", "status"
+        )
+    )
+    carts = list(
+        OrderCart.objects.filter(
+            order__in=Payment.objects.filter(
+                ctime__date=day, is_payment=True
+            ).values("order"),
+            order__is_deleted=False,
+        ).values_list(
+            "order_id",
+            "policy__product_name",
+            "policy__policy__category__name",
+            "price",
+        )
+    )
+    quotations = list(
+        Quotation.objects.filter(ctime__date=day).values_list(
+            "order_id", flat=True
+        )
+    )
+    order_ids = (
+        {order_id for order_id, status in orders}
+        | {cart[0] for cart in carts}
+        | set(quotations)
+    )
+    organizations = get_order_organizations(order_ids)
+    managers = get_order_managers(order_ids)
+
+    for order_id, status in orders:
+        add(order_id, "order", status=status)
+    for order_id, product, category, price in carts:
+        add(
+            order_id,
+            "revenue",
+            amount=float(price or 0),
+            product=product or "",
+            category=category or "",
+        )
+    for order_id in quotations:
+        add(order_id, "quotation")
+
+    for status, count in (
+        pd.Series(
+            OrderLog.objects.filter(mtime__date=day).values_list(
+                "to_status", flat=True
+            ),
+            dtype=object,
+        )
+        .value_counts()
+        .items()
+    ):
+        for by_manager in (False, True):
+            fact = dict.fromkeys(DIMENSIONS, "")
+            fact.update(
+                date=date, metric="status", by_manager=by_manager,
+                status=status, count=int(count), amount=0,
+            )
+            facts.append(fact)
+
+    if not facts:
+        return []
+    df = pd.DataFrame(facts, columns=FACT_COLUMNS)
+    df = df.groupby(
+        ["date", "metric", "by_manager"] + DIMENSIONS, as_index=False
+    )[["count", "amount"]].sum()
+    return df.to_dict("records")
+
+
+def rollup_day(day):
+    facts = build_daily_facts(day)
+    timeout = (
+        TODAY_ROLLUP_TIMEOUT
+        if day >= datetime.date.today()
+        else PAST_ROLLUP_TIMEOUT
+    )
+    cache.set(DAILY_ROLLUP_KEY.format(day.isoformat()), facts, timeout)
+    return facts
+
+
+def invalidate_rollup_days(days):
+    """해당 날짜 집계 삭제 (커밋 이후), 다음 조회 시 다시 집계"""
+    keys = [
+        DAILY_ROLLUP_KEY.format(day.isoformat())
+        for day in set(days)
+        if day is not None
+    ]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_rollup_day(value):
+    return value.date() if value else None
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Quotation)
+@receiver(post_delete, sender=Quotation)
+def invalidate_rollup_ctime(sender, instance, **kwargs):
+    invalidate_rollup_days([get_rollup_day(instance.ctime)])
+
+
+@receiver(post_save, sender=OrderLog)
+@receiver(post_delete, sender=OrderLog)
+def invalidate_rollup_mtime(sender, instance, **kwargs):
+    invalidate_rollup_days([get_rollup_day(instance.mtime)])
+
+
+@receiver(m2m_changed, sender=Order.manager.through)
+def invalidate_rollup_managers(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if isinstance(instance, Order):
+        ctimes = [instance.ctime]
+    else:
+        ctimes = Order.objects.filter(id__in=pk_set or []).values_list(
+            "ctime", flat=True
+        )
+    invalidate_rollup_days([get_rollup_day(ctime) for ctime in ctimes])
+
+
+def rollup_days(start, end):
+    """start ~ end (포함) 일 단위 집계 재생성"""
+    day = start
+    count = 0
+    while day <= end:
+        count += len(rollup_day(day))
+        day += datetime.timedelta(days=1)
+    return count
+
+
+def rollup_recent(days=1):
+    """오늘 포함 최근 N+1 일 재집계 (주문/결제 변경 직후 등)"""
+    today = datetime.date.today()
+    return rollup_days(today - datetime.timedelta(days=days), today)
+
+
+def get_daily_facts(start, end):
+    """
+    start ~ end (포함) 집계 DataFrame
+    * 비어있는 날짜는 최근 날짜부터 MAX_INLINE_ROLLUP_DAYS 일까지만 새로 집계
+    * 그래도 비어있는 날짜가 있으면 RollupPending
+    """
+    days = pd.date_range(start, end, freq="D").date
+    keys = {DAILY_ROLLUP_KEY.format(day.isoformat()): day for day in days}
+    rollups = cache.get_many(list(keys))
+    missing = sorted(
+        (day for key, day in keys.items() if key not in rollups), reverse=True
+    )
+    for day in missing[:MAX_INLINE_ROLLUP_DAYS]:
+        rollups[DAILY_ROLLUP_KEY.format(day.isoformat())] = rollup_day(day)
+    if len(missing) > MAX_INLINE_ROLLUP_DAYS:
+        raise RollupPending(len(missing) - MAX_INLINE_ROLLUP_DAYS)
+    facts = []
+    for key in keys:
+        facts += rollups[key]
+    df = pd.DataFrame(facts, columns=FACT_COLUMNS)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def resample_facts(df, metric, group_by=None, freq="day"):
+    """
+    기간(freq) x 그룹(group_by) 별 count, amount 합계
+    """
+    df = df[
+        (df["metric"] == metric)
+        & (df["by_manager"] == (group_by == "manager"))
+    ]
+    keys = [
+        pd.Grouper(
+            key="date", freq=FREQUENCIES[freq], label="left", closed="left"
+        )
+    ]
+    if group_by:
+        keys.append(group_by)
+    result = df.groupby(keys)[["count", "amount"]].sum().reset_index()
+    result["date"] = result["date"].dt.strftime("%Y-%m-%d")
+    return result.to_dict("records")
+
+
+def dashboard_ajax(request):
+    """
+    대시보드 집계 조회
+    * start, end : YYYY-MM-DD (기본: 최근 30일)
+    * metric : order / revenue / quotation / status
+    * group_by : status / product / category / organization / manager
+    * freq : day / week / month / year
+    """
+    today = datetime.date.today()
+    try:
+        end = (
+            datetime.datetime.strptime(
+                request.GET.get("end"), "%Y-%m-%d"
+            ).date()
+            if request.GET.get("end")
+            else today
+        )
+        start = (
+            datetime.datetime.strptime(
+                request.GET.get("start"), "%Y-%m-%d"
+            ).date()
+            if request.GET.get("start")
+            else end - datetime.timedelta(days=29)
+        )
+    except ValueError:
+        return JsonResponse({"data": "날짜 형식이 잘못되었습니다."}, status=400)
+
+    metric = request.GET.get("metric", "revenue")
+    group_by = request.GET.get("group_by") or None
+    freq = request.GET.get("freq", "day")
+    if (
+        metric not in METRICS
+        or (group_by and group_by not in DIMENSIONS)
+        or freq not in FREQUENCIES
+        or start > end
+    ):
+        return JsonResponse({"data": "잘못된 조회 조건입니다."}, status=400)
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return JsonResponse(
+            {"data": f"조회 기간은 최대 {MAX_RANGE_DAYS}일입니다."}, status=400
+        )
+
+    try:
+        df = get_daily_facts(start, end)
+    except RollupPending as e:
+        return JsonResponse(
+            {"data": f"{e} 잠시 후 다시 조회해주세요.", "missing": e.missing},
+            status=503,
+        )
+    return JsonResponse(
+        {
+            "data": resample_facts(df, metric, group_by, freq),
+            "status": True,
+        }
+    )
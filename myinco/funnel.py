@@ -0,0 +1,379 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from isghome.models import Order, OrderCart, OrderLog
+
+
+"""
+주문 퍼널 / 상태별 소요시간 분석
+* OrderLog 를 id 기준 watermark 이후만 읽어서 누적 상태(state)에 반영 (fold)
+  * 주문별 현재 상태 구간과 도달 단계는 주문 id 구간별 조각으로 저장
+  * 끝난 구간의 소요시간은 상태별 합계/건수/구간(bucket) 분포로만 보관
+* 계산 결과는 group_by 별로 캐싱, OrderLog 최대 id 가 같으면 캐시 사용
+"""
+
+FUNNEL_STATE_KEY = "myinco:funnel:state"
+FUNNEL_STATE_CHUNK_KEY = "myinco:funnel:state:{}"
+FUNNEL_STATE_LOCK_KEY = "myinco:funnel:state:lock"
+FUNNEL_STATE_LOCK_TIMEOUT = 60
+# 주문 id 구간 크기 (조각 하나에 들어가는 주문 수)
+FUNNEL_STATE_CHUNK_SIZE = 5000
+FUNNEL_SUMMARY_KEY = "myinco:funnel:summary:{}"
+FUNNEL_SUMMARY_TIMEOUT = 60 * 10
+
+FUNNEL_STAGES = [
+    "estimate-request",
+    "estimate-complete",
+    "payment-request",
+    "payment-complete",
+]
+# 더 이상 진행되지 않는 상태 (정체 대상 제외)
+TERMINAL_STATUSES = [
+    "payment-complete",
+    "request-cancel",
+    "payment-cancel",
+    "order-cancel",
+    "estimate-expire",
+]
+STALL_HOURS = 24 * 7
+STALL_LIMIT = 100
+GROUP_BY = ["manager", "product"]
+
+
+def get_log_watermark():
+    """OrderLog 최대 id (없으면 0)"""
+    return (
+        OrderLog.objects.order_by("-id").values_list("id", flat=True).first()
+        or 0
+    )
+
+
+def get_state_chunk_keys(indexes):
+    return {FUNNEL_STATE_CHUNK_KEY.format(index): index for index in indexes}
+
+
+def bucket_hours(hours):
+    """
+    중앙값 계산용 소요시간 구간
+    * 하루 미만 0.1시간, 30일 미만 1시간, 그 이상 1일 단위
+    """
+    return pd.Series(
+        np.where(
+            hours < 24,
+            hours.round(1),
+            np.where(hours < 24 * 30, hours.round(0), (hours / 24).round(0) * 24),
+        ),
+        index=hours.index,
+    )
+
+
+def load_funnel_state():
+    """
+    누적 상태 (meta, {조각 번호: 조각})
+    * meta : {"watermark", "chunks": [조각 번호], "durations": {상태: 분포}}
+    * 조각 : {"watermark", "orders": {주문 id: [현재 상태, 시각, [도달 단계]]}}
+    * 조각이 하나라도 없으면 (삭제, 저장 실패) 빈 상태에서 다시 적재
+    """
+    meta = cache.get(FUNNEL_STATE_KEY)
+    if meta is not None:
+        keys = get_state_chunk_keys(meta["chunks"])
+        chunks = cache.get_many(list(keys))
+        if len(chunks) == len(keys):
+            return meta, {keys[key]: chunk for key, chunk in chunks.items()}
+    return {"watermark": 0, "chunks": [], "durations": {}}, {}
+
+
+def fold_order_logs():
+    """
+    watermark 이후 OrderLog 를 누적 상태에 반영 후 (meta, chunks) 반환
+    * 주문의 현재 구간을 첫 로그로 두고 새 로그와 함께 get_status_spans 계산
+    * 끝난 구간은 durations 에 더하고, 변경된 주문이 속한 조각만 다시 저장
+    * 다른 요청이 반영 중이면 저장하지 않고 계산 결과만 사용
+    """
+    meta, chunks = load_funnel_state()
+    new_rows = list(
+        OrderLog.objects.filter(id__gt=meta["watermark"])
+        .order_by("id")
+        .values_list("id", "order_id", "to_status", "mtime")
+    )
+    if not new_rows:
+        return meta, chunks
+
+    logs = pd.DataFrame(
+        new_rows, columns=["id", "order_id", "to_status", "mtime"]
+    )
+    logs["chunk"] = logs["order_id"] // FUNNEL_STATE_CHUNK_SIZE
+    # 조각 저장 후 meta 저장 전에 끊긴 경우 이미 반영된 로그는 제외
+    chunk_watermarks = logs["chunk"].map(
+        {index: chunk["watermark"] for index, chunk in chunks.items()}
+    )
+    logs = logs[logs["id"] > chunk_watermarks.fillna(0)]
+    watermark = new_rows[-1][0]
+
+    touched = set(logs["chunk"].tolist())
+    for index in touched:
+        chunks.setdefault(index, {"watermark": 0, "orders": {}})
+    opened = [
+        (order_id, state[0], state[1])
+        for order_id, index in logs[["order_id", "chunk"]]
+        .drop_duplicates("order_id")
+        .itertuples(index=False)
+        for state in [chunks[index]["orders"].get(order_id)]
+        if state is not None
+    ]
+    spans = get_status_spans(
+        opened
+        + list(
+            logs[["order_id", "to_status", "mtime"]].itertuples(
+                index=False, name=None
+            )
+        ),
+        datetime.datetime.now(),
+    )
+
+    durations = meta["durations"]
+    closed = spans[~spans["is_open"]]
+    closed = closed.assign(bucket=bucket_hours(closed["hours"]))
+    for status, rows in closed.groupby("to_status"):
+        total = durations.setdefault(
+            status, {"sum": 0.0, "count": 0, "buckets": {}}
+        )
+        total["sum"] += float(rows["hours"].sum())
+        total["count"] += int(len(rows))
+        for bucket, count in rows["bucket"].value_counts().items():
+            total["buckets"][float(bucket)] = total["buckets"].get(
+                float(bucket), 0
+            ) + int(count)
+
+    for order_id, status, mtime in spans[spans["is_open"]][
+        ["order_id", "to_status", "mtime"]
+    ].itertuples(index=False):
+        orders = chunks[order_id // FUNNEL_STATE_CHUNK_SIZE]["orders"]
+        stages = orders[order_id][2] if order_id in orders else []
+        orders[order_id] = [status, mtime.to_pydatetime(), stages]
+    for order_id, status in logs[logs["to_status"].isin(FUNNEL_STAGES)][
+        ["order_id", "to_status"]
+    ].itertuples(index=False):
+        stages = chunks[order_id // FUNNEL_STATE_CHUNK_SIZE]["orders"][
+            order_id
+        ][2]
+        if status not in stages:
+            stages.append(status)
+
+    for index in touched:
+        chunks[index]["watermark"] = watermark
+    meta = {
+        "watermark": watermark,
+        "chunks": sorted(set(meta["chunks"]) | touched),
+        "durations": durations,
+    }
+    if cache.add(FUNNEL_STATE_LOCK_KEY, 1, FUNNEL_STATE_LOCK_TIMEOUT):
+        try:
+            cache.set_many(
+                {
+                    FUNNEL_STATE_CHUNK_KEY.format(index): chunks[index]
+                    for index in touched
+                },
+                None,
+            )
+            cache.set(FUNNEL_STATE_KEY, meta, None)
+        finally:
+            cache.delete(FUNNEL_STATE_LOCK_KEY)
+    return meta, chunks
+
+
+def reset_funnel_state():
+    cache.delete(FUNNEL_STATE_KEY)
+
+
+def get_status_spans(rows, now):
+    """
+    상태 구간 DataFrame
+    * 같은 상태가 연속된 로그(담당자만 변경 등)는 첫 로그 하나로 합침
+    * 각 구간은 다음 상태 로그 시각까지를 소요시간으로 계산
+    * 마지막 구간은 현재 시각까지 (is_open)
+    """
+    df = pd.DataFrame(rows, columns=["order_id", "to_status", "mtime"])
+    df["mtime"] = pd.to_datetime(df["mtime"])
+    df = df.sort_values(["order_id", "mtime"], kind="stable")
+    df = df[
+        df["to_status"] != df.groupby("order_id")["to_status"].shift(1)
+    ]
+    df["until"] = df.groupby("order_id")["mtime"].shift(-1)
+    df["is_open"] = df["until"].isna()
+    df["until"] = df["until"].fillna(pd.Timestamp(now))
+    df["hours"] = (df["until"] - df["mtime"]).dt.total_seconds() / 3600
+    return df
+
+
+def get_status_durations(durations):
+    """
+    상태별 소요시간 (다음 상태로 넘어간 구간만, 시간 단위)
+    * 평균은 합계/건수, 중앙값은 bucket_hours 구간 분포 기준
+    """
+    result = {}
+    for status, total in durations.items():
+        buckets = pd.Series(total["buckets"]).sort_index()
+        median = buckets.index[
+            (buckets.cumsum() >= total["count"] / 2).to_numpy().argmax()
+        ]
+        result[status] = {
+            "mean": round(total["sum"] / total["count"], 2),
+            "median": round(float(median), 2),
+            "count": total["count"],
+        }
+    return result
+
+
+def get_open_spans(chunks, now):
+    """주문별 현재 상태 구간 DataFrame (get_stalled_orders 입력)"""
+    df = pd.DataFrame(
+        [
+            (order_id, status, mtime)
+            for chunk in chunks.values()
+            for order_id, (status, mtime, stages) in chunk["orders"].items()
+        ],
+        columns=["order_id", "to_status", "mtime"],
+    )
+    df["mtime"] = pd.to_datetime(df["mtime"])
+    df["is_open"] = True
+    df["hours"] = (pd.Timestamp(now) - df["mtime"]).dt.total_seconds() / 3600
+    return df
+
+
+def get_reached_stages(chunks):
+    """주문별 도달 단계 DataFrame (get_funnel_rates 입력)"""
+    return pd.DataFrame(
+        [
+            (order_id, stage)
+            for chunk in chunks.values()
+            for order_id, (status, mtime, stages) in chunk["orders"].items()
+            for stage in stages
+        ],
+        columns=["order_id", "to_status"],
+    )
+
+
+def get_funnel_rates(df, groups=None):
+    """
+    단계별 도달 주문 수와 첫 단계 대비 전환율
+    * groups : order_id, group 컬럼 DataFrame (주문당 여러 행 가능)
+    """
+    df = df[df["to_status"].isin(FUNNEL_STAGES)][["order_id", "to_status"]]
+    keys = ["to_status"]
+    if groups is not None:
+        df = df.merge(groups, on="order_id")
+        keys = ["group", "to_status"]
+    reached = df.groupby(keys)["order_id"].nunique()
+    if groups is not None:
+        reached = reached.unstack(fill_value=0)
+    else:
+        reached = reached.to_frame().T
+    reached = reached.reindex(columns=FUNNEL_STAGES, fill_value=0)
+    base = reached[FUNNEL_STAGES[0]].where(reached[FUNNEL_STAGES[0]] > 0)
+    rates = reached.div(base, axis=0).fillna(0).round(4)
+    return [
+        {
+            "group": group if groups is not None else None,
+            "reached": {
+                stage: int(reached.loc[group, stage]) for stage in FUNNEL_STAGES
+            },
+            "rates": {
+                stage: float(rates.loc[group, stage]) for stage in FUNNEL_STAGES
+            },
+        }
+        for group in reached.index
+    ]
+
+
+def get_stalled_orders(df, stall_hours=STALL_HOURS, limit=STALL_LIMIT):
+    """마지막 상태에서 stall_hours 이상 머문 진행 중 주문"""
+    current = df[df["is_open"] & ~df["to_status"].isin(TERMINAL_STATUSES)]
+    stalled = current[current["hours"] >= stall_hours].nlargest(
+        limit, "hours"
+    )
+    identifiers = dict(
+        Order.objects.filter(
+            id__in=stalled["order_id"].tolist(), is_deleted=False
+        ).values_list("id", "identifier")
+    )
+    return [
+        {
+            "order_id": int(order_id),
+            "identifier": identifiers[order_id],
+            "status": status,
+            "hours": round(float(hours), 2),
+        }
+        for order_id, status, hours in stalled[
+            ["order_id", "to_status", "hours"]
+        ].itertuples(index=False)
+        if order_id in identifiers
+    ]
+
+
+def get_order_groups(group_by):
+    """order_id 별 담당자명 / 상품명 DataFrame"""
+    if group_by == "manager":
+        field = Order._meta.get_field("manager")
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        rows = through.objects.values_list(
+            f"{source}_id", f"{target}__profile__name"
+        )
+    else:
+        rows = OrderCart.objects.values_list(
+            "order_id", "policy__product_name"
+        ).distinct()
+    groups = pd.DataFrame(list(rows), columns=["order_id", "group"])
+    groups["group"] = groups["group"].fillna("")
+    return groups.drop_duplicates()
+
+
+def get_funnel_summary(group_by=None):
+    """
+    퍼널 요약 (상태별 소요시간, 전환율, 정체 주문)
+    * OrderLog 최대 id 가 캐시와 같으면 누적 상태를 읽지 않고 캐시 사용
+    * 새 로그가 있으면 새 로그만 누적 상태에 반영 후 다시 계산
+    """
+    key = FUNNEL_SUMMARY_KEY.format(group_by or "all")
+    summary = cache.get(key)
+    if summary and summary["watermark"] == get_log_watermark():
+        return summary
+
+    meta, chunks = fold_order_logs()
+    summary = {
+        "watermark": meta["watermark"],
+        "durations": {},
+        "funnel": [],
+        "stalled": [],
+    }
+    if chunks:
+        groups = get_order_groups(group_by) if group_by else None
+        summary.update(
+            durations=get_status_durations(meta["durations"]),
+            funnel=get_funnel_rates(get_reached_stages(chunks), groups),
+            stalled=get_stalled_orders(
+                get_open_spans(chunks, datetime.datetime.now())
+            ),
+        )
+    cache.set(key, summary, FUNNEL_SUMMARY_TIMEOUT)
+    return summary
+
+
+def order_funnel_ajax(request):
+    """
+    주문 퍼널 조회
+    * group_by : manager / product (미지정 시 전체)
+    """
+    group_by = request.GET.get("group_by") or None
+    if group_by and group_by not in GROUP_BY:
+        return JsonResponse({"data": "잘못된 조회 조건입니다."}, status=400)
+    return JsonResponse(
+        {"data": get_funnel_summary(group_by), "status": True}
+    )
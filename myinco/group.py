@@ -63,19 +63,7 @@ class MyincoGroupListView(ListView, CreateView):
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
 
-        users = User.objects.annotate(
-            is_account=Value(True, output_field=BooleanField())
-        )
-        groups = AuthGroup.objects.annotate(
-            is_account=Value(False, output_field=BooleanField())
-        )
-
-        search_list = []
-        for user in users:
-            search_list.append(user)
-        for group in groups:
-            search_list.append(group)
-
+        # 계정/그룹 검색은 search_picker_ajax (kind=account) 로 조회
         context_data["form"] = AuthGroupCreateForm(
             initial={
                 "name": "",
@@ -85,8 +73,6 @@ class MyincoGroupListView(ListView, CreateView):
             }
         )
 
-        context_data["search_list"] = search_list
-
         return context_data
 
     def post(self, request, *args, **kwargs):
@@ -294,19 +280,6 @@ def open_group_update_modal(request):
     auth_group = AuthGroup.objects.get(id=object_id)
     user = User.objects.get(id=user_id)
 
-    users = User.objects.annotate(
-        is_account=Value(True, output_field=BooleanField())
-    )
-    groups = AuthGroup.objects.annotate(
-        is_account=Value(False, output_field=BooleanField())
-    )
-
-    search_list = []
-    for user in users:
-        search_list.append(user)
-    for group in groups:
-        search_list.append(group)
-
     members = (
         auth_group.membership_set.all()
         .annotate(is_account=Value(True, output_field=BooleanField()))
@@ -327,7 +300,6 @@ def open_group_update_modal(request):
     try:
         context = {
             "object": auth_group,
-            "search_list": search_list,
             "manager": auth_group.owner,
             "user": request.user,
             "joined_list": joined_list,
@@ -0,0 +1,279 @@
+import re
+import uuid
+import difflib
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from isghome.models import User, UserProfile, Customer
+
+
+"""
+고객 <-> 계정 연동 추천
+* 정규화한 연락처/이메일을 키로 하는 매칭 인덱스를 프로세스 내부에 보관
+  * phone : {정규화 전화번호: [(id, 정규화 이름), ...]}
+  * email : {정규화 이메일: [(id, 정규화 이름), ...]}
+* 이름이 같고 전화번호 또는 이메일이 같으면 추천
+  (fuzzy=True 이면 이름은 유사도 FUZZY_NAME_RATIO 이상)
+* 고객/계정 저장·삭제 시 커밋 이후 변경 번호(sequence)와 변경 대상을 공용 캐시에 기록
+  * 각 프로세스는 밀린 변경 대상 row 만 다시 조회해서 인덱스에 반영
+  * 변경 기록이 없거나 MATCH_INDEX_MAX_CHANGES 보다 많이 밀리면 전체 재생성
+"""
+
+MATCH_INDEX_VERSION_KEY = "myinco:matching:version"
+MATCH_INDEX_SEQUENCE_KEY = "myinco:matching:seq"
+MATCH_INDEX_CHANGE_KEY = "myinco:matching:change:{}"
+MATCH_INDEX_CHANGE_TIMEOUT = 60 * 60
+MATCH_INDEX_MAX_CHANGES = 1000
+# 인덱스에 쓰이는 필드 (그 외 필드만 저장한 경우 갱신 제외)
+MATCH_FIELDS = {"name", "phone_number", "email", "is_deleted"}
+# 연락처가 일치하는 후보 중 오타 허용용 (3글자 이름에서 1글자 차이 = 0.67)
+FUZZY_NAME_RATIO = 0.6
+
+_match_index = {"version": None, "sequence": 0, "data": None}
+_match_index_lock = threading.Lock()
+
+
+def normalize_name(value):
+    """공백 제거, 소문자"""
+    return re.sub(r"\s+", "", value or "").lower()
+
+
+def normalize_phone(value):
+    """숫자만 (+82 국가번호는 0 으로)"""
+    digits = re.sub(r"\D", "", value or "")
+    if digits.startswith("82") and len(digits) > 10:
+        digits = "0" + digits[2:]
+    return digits
+
+
+def normalize_email(value):
+    return (value or "").strip().lower()
+
+
+def is_similar_name(a, b):
+    """
+    이름 유사 여부
+    * 성(첫 글자)이 같고 SequenceMatcher 비율이 FUZZY_NAME_RATIO 이상
+    """
+    if not a or not b or a[0] != b[0]:
+        return False
+    return difflib.SequenceMatcher(None, a, b).ratio() >= FUZZY_NAME_RATIO
+
+
+class MatchIndex:
+    def __init__(self, rows):
+        self.phone = {}
+        self.email = {}
+        self.keys = {}
+        for row in rows:
+            self.add(*row)
+
+    def add(self, pk, name, phone, email):
+        entry = (pk, normalize_name(name))
+        phone = normalize_phone(phone)
+        email = normalize_email(email)
+        self.keys[pk] = (phone, email)
+        if phone:
+            self.phone.setdefault(phone, []).append(entry)
+        if email:
+            self.email.setdefault(email, []).append(entry)
+
+    def remove(self, pk):
+        phone, email = self.keys.pop(pk, ("", ""))
+        for index, key in ((self.phone, phone), (self.email, email)):
+            if key in index:
+                index[key] = [entry for entry in index[key] if entry[0] != pk]
+                if not index[key]:
+                    del index[key]
+
+    def update(self, pks, rows):
+        """pks 항목 제거 후 rows (삭제되지 않은 현재 값) 다시 추가"""
+        for pk in pks:
+            self.remove(pk)
+        for row in rows:
+            self.add(*row)
+
+    def find(self, name, phone, email, fuzzy=False):
+        """조건에 맞는 id set"""
+        name = normalize_name(name)
+        if not name:
+            return set()
+        entries = self.phone.get(normalize_phone(phone), []) + self.email.get(
+            normalize_email(email), []
+        )
+        return {
+            pk
+            for pk, entry_name in entries
+            if entry_name == name
+            or (fuzzy and is_similar_name(entry_name, name))
+        }
+
+
+def get_user_rows(**lookup):
+    return UserProfile.objects.filter(is_deleted=False, **lookup).values_list(
+        "id", "name", "phone_number", "user__email"
+    )
+
+
+def get_customer_rows(**lookup):
+    return Customer.objects.filter(is_deleted=False, **lookup).values_list(
+        "id", "name", "phone_number", "email"
+    )
+
+
+def get_match_index_version():
+    version = cache.get(MATCH_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(MATCH_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(MATCH_INDEX_VERSION_KEY)
+    return version
+
+
+def get_match_index_sequence():
+    sequence = cache.get(MATCH_INDEX_SEQUENCE_KEY)
+    if sequence is None:
+        # 변경 번호가 사라지면 밀린 변경을 알 수 없으므로 전체 재생성
+        cache.set(MATCH_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        cache.add(MATCH_INDEX_SEQUENCE_KEY, 0, None)
+        sequence = cache.get(MATCH_INDEX_SEQUENCE_KEY) or 0
+    return sequence
+
+
+def record_match_change(kind, pk):
+    """
+    커밋 이후 변경 대상 기록
+    * kind : user (UserProfile id) / account (User id) / customer
+    """
+
+    def publish():
+        try:
+            sequence = cache.incr(MATCH_INDEX_SEQUENCE_KEY)
+        except ValueError:
+            get_match_index_sequence()
+            return
+        cache.set(
+            MATCH_INDEX_CHANGE_KEY.format(sequence),
+            (kind, pk),
+            MATCH_INDEX_CHANGE_TIMEOUT,
+        )
+
+    transaction.on_commit(publish)
+
+
+def build_match_index():
+    return {
+        "user": MatchIndex(get_user_rows()),
+        "customer": MatchIndex(get_customer_rows()),
+    }
+
+
+def apply_match_changes(data, start, end):
+    """
+    start 초과 end 이하 변경 번호의 대상 row 만 다시 조회해서 반영
+    * 변경 기록이 하나라도 없으면 False (전체 재생성 필요)
+    """
+    keys = [
+        MATCH_INDEX_CHANGE_KEY.format(sequence)
+        for sequence in range(start + 1, end + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return False
+    ids = {"user": set(), "account": set(), "customer": set()}
+    for kind, pk in changes.values():
+        ids[kind].add(pk)
+    if ids["account"]:
+        ids["user"] |= set(
+            UserProfile.objects.filter(user_id__in=ids["account"]).values_list(
+                "id", flat=True
+            )
+        )
+    if ids["user"]:
+        data["user"].update(ids["user"], get_user_rows(id__in=ids["user"]))
+    if ids["customer"]:
+        data["customer"].update(
+            ids["customer"], get_customer_rows(id__in=ids["customer"])
+        )
+    return True
+
+
+def get_match_index():
+    """{"user": MatchIndex, "customer": MatchIndex}"""
+    version = get_match_index_version()
+    sequence = get_match_index_sequence()
+    data = _match_index["data"]
+    if (
+        _match_index["version"] == version
+        and _match_index["sequence"] == sequence
+        and data is not None
+    ):
+        return data
+    with _match_index_lock:
+        current = _match_index["sequence"]
+        if (
+            _match_index["version"] != version
+            or _match_index["data"] is None
+            or not current <= sequence <= current + MATCH_INDEX_MAX_CHANGES
+            or not apply_match_changes(_match_index["data"], current, sequence)
+        ):
+            # 조회 중 발생한 변경은 다음 호출에서 다시 반영 (재반영해도 결과 동일)
+            _match_index["data"] = build_match_index()
+            _match_index["version"] = version
+        _match_index["sequence"] = sequence
+    return _match_index["data"]
+
+
+def get_user_candidates(customer, fuzzy=False):
+    """고객과 연동 가능한 계정(UserProfile) 추천"""
+    ids = get_match_index()["user"].find(
+        customer.name, customer.phone_number, customer.email, fuzzy=fuzzy
+    )
+    return (
+        UserProfile.objects.filter(id__in=ids)
+        .select_related("user")
+        .order_by("-ctime")
+    )
+
+
+def get_customer_candidates(user_profile, fuzzy=False):
+    """계정과 연동 가능한 고객 추천"""
+    ids = get_match_index()["customer"].find(
+        user_profile.name,
+        user_profile.phone_number,
+        user_profile.user.email,
+        fuzzy=fuzzy,
+    )
+    return Customer.objects.filter(id__in=ids).order_by("-ctime")
+
+
+def is_match_field_changed(update_fields):
+    # 로그인 시각, 연동 여부 갱신 등 인덱스와 무관한 저장은 제외
+    return not update_fields or bool(MATCH_FIELDS & set(update_fields))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def update_match_index_user(sender, instance, update_fields=None, **kwargs):
+    if is_match_field_changed(update_fields):
+        record_match_change("user", instance.id)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def update_match_index_customer(
+    sender, instance, update_fields=None, **kwargs
+):
+    if is_match_field_changed(update_fields):
+        record_match_change("customer", instance.id)
+
+
+@receiver(post_save, sender=User)
+def update_match_index_account(
+    sender, instance, update_fields=None, **kwargs
+):
+    if is_match_field_changed(update_fields):
+        record_match_change("account", instance.id)
@@ -5,11 +5,86 @@ from django.urls import reverse_lazy
 from django.contrib.auth.models import User
 from isghome.models import Notification
 from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import (
+    JsonResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 
+import json
+import time
+import datetime
+
+
+# 헤더 뱃지용 읽지 않은 알림 수 / 사용자별 최신 알림 id 캐시
+UNREAD_COUNT_KEY = "myinco:notification:unread:{}"
+UNREAD_COUNT_TIMEOUT = 60 * 5
+LATEST_ID_KEY = "myinco:notification:latest:{}"
+
+# SSE 연결 최대 유지 시간(초), 새 알림 전송 또는 시간 초과 시 응답 종료
+# 이후 EventSource 가 STREAM_RETRY(ms) 뒤 Last-Event-ID 로 재접속
+STREAM_TIMEOUT = 15
+STREAM_INTERVAL = 1
+STREAM_RETRY = 1000
+
+
+def get_unread_count(user):
+    key = UNREAD_COUNT_KEY.format(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            target_user=user, is_check=False
+        ).count()
+        cache.add(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread_count(user_id):
+    cache.delete(UNREAD_COUNT_KEY.format(user_id))
+
+
+def incr_unread_count(user_id, delta=1):
+    try:
+        cache.incr(UNREAD_COUNT_KEY.format(user_id), delta)
+    except ValueError:
+        # 캐시에 없으면 다음 조회 시 다시 계산
+        pass
+
+
+@receiver(post_save, sender=Notification)
+def update_notification_cache(sender, instance, created, **kwargs):
+    user_id = instance.target_user_id
+    if created:
+
+        def on_commit():
+            cache.set(LATEST_ID_KEY.format(user_id), instance.id, None)
+            if not instance.is_check:
+                incr_unread_count(user_id)
+
+        transaction.on_commit(on_commit)
+    else:
+        transaction.on_commit(lambda: invalidate_unread_count(user_id))
+
+
+@receiver(post_delete, sender=Notification)
+def delete_notification_cache(sender, instance, **kwargs):
+    user_id = instance.target_user_id
+    transaction.on_commit(lambda: invalidate_unread_count(user_id))
+
+
+def notification_unread_count(request):
+    """context processor: 헤더 뱃지"""
+    if not request.user.is_authenticated:
+        return {}
+    return {"unread_notification_count": get_unread_count(request.user)}
+
 
 class MyincoNotificationListView(ListView):
     template_name = "myinco_admin/notification/list.html"
@@ -53,6 +128,7 @@ class MyincoNotificationListView(ListView):
         p = Paginator(objects, 10)
         context_data["object_list"] = p.page(1)
         context_data["page"] = 1
+        context_data["unread_count"] = get_unread_count(self.request.user)
         return context_data
 
 
@@ -130,9 +206,12 @@ def open_notification_detail_modal(request):
 def notification_read_check_ajax(request):
     object_id = request.POST.get("notification_id")
 
-    notification = Notification.objects.get(id=object_id)
-    notification.is_check = True
-    notification.save()
+    # 이미 읽은 알림이면 UPDATE 대상 없음
+    updated = Notification.objects.filter(
+        id=object_id, target_user=request.user, is_check=False
+    ).update(is_check=True)
+    if updated:
+        incr_unread_count(request.user.id, -updated)
 
     return JsonResponse(
         {
@@ -143,7 +222,141 @@ def notification_read_check_ajax(request):
 
 
 def notification_all_read_ajax(request):
-    print(request.__dict__)
-    notifications = Notification.objects.filter(target_user=request.user)
-    notifications.update(is_check=True)
+    Notification.objects.filter(
+        target_user=request.user, is_check=False
+    ).update(is_check=True)
+    invalidate_unread_count(request.user.id)
     return HttpResponseRedirect(request.environ["HTTP_REFERER"])
+
+
+def notification_bulk_check_ajax(request):
+    """
+    알림 일괄 읽음/안읽음 처리
+    * notification_ids : 대상 알림 id 목록 (없으면 아래 조건 사용)
+    * before : 해당 시각(%Y-%m-%d %H:%M:%S) 이전 알림
+    * page_name, keyword : 로그 페이지명 / 작성자 검색
+    * is_check : "true"(읽음) / "false"(안읽음)
+    """
+    is_check = request.POST.get("is_check", "true") != "false"
+    notification_ids = request.POST.getlist("notification_ids")
+    if len(notification_ids) == 1 and notification_ids[0].startswith("["):
+        notification_ids = json.loads(notification_ids[0])
+    before = request.POST.get("before")
+    page_name = request.POST.get("page_name")
+    keyword = request.POST.get("keyword")
+
+    queryset = Notification.objects.filter(target_user=request.user)
+    if notification_ids:
+        queryset = queryset.filter(id__in=notification_ids)
+    else:
+        if before:
+            try:
+                before = datetime.datetime.strptime(
+                    before, "%Y-%m-%d %H:%M:%S"
+                )
+            except ValueError:
+                return JsonResponse({"status": False}, status=400)
+            queryset = queryset.filter(ctime__lt=before)
+        if page_name:
+            queryset = queryset.filter(log__page_name=page_name)
+        if keyword:
+            queryset = queryset.filter(
+                Q(log__user__profile__name__icontains=keyword)
+                | Q(log__page_name__icontains=keyword)
+            )
+
+    updated = queryset.exclude(is_check=is_check).update(is_check=is_check)
+    invalidate_unread_count(request.user.id)
+
+    return JsonResponse(
+        {
+            "data": {
+                "updated": updated,
+                "unread_count": get_unread_count(request.user),
+            },
+            "status": True,
+        }
+    )
+
+
+def notification_unread_count_ajax(request):
+    return JsonResponse(
+        {
+            "data": {"unread_count": get_unread_count(request.user)},
+            "status": True,
+        }
+    )
+
+
+def serialize_notification(notification):
+    log = notification.log
+    user_name = ""
+    if log and log.user:
+        user_name = log.user.profile.name
+    return {
+        "id": notification.id,
+        "page_name": log.page_name if log else "",
+        "url": log.url if log else "",
+        "user_name": user_name,
+        "is_check": notification.is_check,
+        "ctime": notification.ctime.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def notification_stream(request):
+    """
+    SSE 알림 스트림
+    * Last-Event-ID(재접속) 또는 last_id 이후 생성된 알림을 전송
+    * 최신 알림 id 캐시가 바뀐 경우에만 DB 조회
+    * 짧은 long-poll : 새 알림을 보내면 바로 종료해서 worker 점유 시간을 줄임
+    """
+    user = request.user
+    last_id = request.META.get("HTTP_LAST_EVENT_ID") or request.GET.get(
+        "last_id"
+    )
+    if last_id and str(last_id).isdigit():
+        last_id = int(last_id)
+    else:
+        last_id = (
+            Notification.objects.filter(target_user=user)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+            or 0
+        )
+
+    def event_stream(last_id):
+        deadline = time.monotonic() + STREAM_TIMEOUT
+        yield f"retry: {STREAM_RETRY}\n\n"
+        while time.monotonic() < deadline:
+            latest_id = cache.get(LATEST_ID_KEY.format(user.id))
+            if latest_id is None or latest_id > last_id:
+                notifications = (
+                    Notification.objects.filter(
+                        target_user=user, id__gt=last_id
+                    )
+                    .select_related("log__user__profile")
+                    .order_by("id")
+                )
+                sent = False
+                for notification in notifications:
+                    sent = True
+                    last_id = notification.id
+                    data = json.dumps(serialize_notification(notification))
+                    yield f"id: {last_id}\nevent: notification\ndata: {data}\n\n"  # noqa
+                if latest_id is None:
+                    cache.set(LATEST_ID_KEY.format(user.id), last_id, None)
+                data = json.dumps({"unread_count": get_unread_count(user)})
+                yield f"event: unread\ndata: {data}\n\n"
+                if sent:
+                    return
+            else:
+                yield ": keep-alive\n\n"
+            time.sleep(STREAM_INTERVAL)
+
+    response = StreamingHttpResponse(
+        event_stream(last_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -1,6 +1,7 @@
 import json
 import datetime
 import copy
+import hashlib
 
 from django import forms
 from django.views.generic import (
@@ -9,20 +10,23 @@ from django.views.generic import (
     CreateView,
 )
 
-from django.http import HttpResponseRedirect, JsonResponse
+from django.http import (
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+    JsonResponse,
+)
 from django.urls import reverse_lazy
 from django.utils.safestring import mark_safe
-from django.db.models import Case, When, Q
+from django.db.models import Q
 from django.db import transaction
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
-from isghome.views import send_auto_email
 
 from isghome.models import (
     User,
     Order,
     Quotation,
-    OrderBookmark,
     Payment,
     PurchaseOrder,
     OrderLog,
@@ -33,15 +37,66 @@ from isghome.models import (
     SystemLog,
     AuthGroup,
 )
-from isghome.views import generate_order_identifier
 from isghome.utils import PDFError, QuotationError
-from isghome.views.myinco.util import make_system_log
+from isghome.views.myinco.util import (
+    attach_total_sales,
+    make_system_log,
+    complete_system_log,
+    get_sheet_rows,
+    get_sheet_section,
+    revert_sheet_delta,
+    invalidate_sales_totals,
+)
+from isghome.views.myinco.catalog import get_catalog
+from isghome.views.myinco.bookmark import (
+    annotate_bookmarked,
+    toggle_bookmark,
+)
+from isghome.views.myinco.order_identifier import (
+    OrderIdentifierError,
+    order_identifier_lock,
+    allocate_order_identifier,
+    allocate_division_identifier,
+)
+from isghome.views.myinco.order_status import (
+    PAYMENT_EMAIL_TEMPLATE,
+    STATUS_MESSAGES,
+    send_order_email,
+    notify_order,
+    OrderTransitionError,
+    lock_order,
+    transition_order,
+    bulk_update_orders,
+)
 from isghome.utils import myinco_token_generator
 from isghome.tasks import update_quotation
 
 import time
 
 
+# 견적서 시트 컬럼: 목록 조회 시 제외하고 quotation_sheet_ajax 로 따로 조회
+QUOTATION_SHEET_FIELDS = ("context", "remarks")
+# 견적서 수정 안내 메일 기준 필드 (작성일 제외)
+QUOTATION_EVENT_FIELDS = (
+    "name",
+    "pub_date_from",
+    "pub_date_to",
+    "is_published",
+    "manager_id",
+    "receiver_name",
+    "receiver_organization",
+    "receiver_email",
+    "context",
+    "remarks",
+    "original_price",
+    "special_offer_price",
+    "vat",
+    "final_price",
+)
+# 같은 내용의 결제/견적서 등록을 중복 제출로 보는 시간 (초)
+DUPLICATE_REQUEST_SECONDS = 60
+
+
 class OrderDetailForm(forms.ModelForm):
     class Meta:
         model = Order
@@ -119,21 +174,6 @@ class MyincoAdminOrderListView(ListView, CreateView):
         keyword = self.request.GET.get("keyword")
 
         if keyword:
-            # code_ids = []
-            # for order in queryset:
-            #     service_code_check = [
-            #         keyword in item.policy.get_service_code()
-            #         for item in order.ordercart_set.all()
-            #     ]
-            #     print(
-            #         [
-            #             item.policy.get_service_code()
-            #             for item in order.ordercart_set.all()
-            #         ]
-            #     )
-            #     if any(service_code_check):
-            #         code_ids.append(order.id)
-
             queryset = queryset.filter(
                 Q(identifier__icontains=keyword)
                 | Q(manager__profile__name__icontains=keyword)
@@ -150,7 +190,6 @@ class MyincoAdminOrderListView(ListView, CreateView):
                     purchaser_user__profile__organization__place_name__icontains=keyword  # noqa
                 )
                 | Q(ordercart__policy__product_name__icontains=keyword)
-                # | Q(ordercart__policy__get_service_code=keyword)  # noqa
                 | Q(ordercart__policy__service_code__icontains=keyword)
             )
 
@@ -168,22 +207,9 @@ class MyincoAdminOrderListView(ListView, CreateView):
         #     final_price=F("payment__final_price"),
         # ).distinct()
 
-        queryset = queryset.annotate(
-            is_bookmarked=Case(
-                When(
-                    orderbookmark__user__id=user_id,
-                    then=True,
-                ),
-                default=False,
-            )
-        )
-
-        true_set = queryset.filter(is_bookmarked=True).distinct()
-        ids = true_set.values_list("id", flat=True)
-        false_set = (
-            queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
+        queryset = annotate_bookmarked(
+            queryset.distinct(), "order", user_id
         )
-        queryset = true_set | false_set
 
         ordering = self.get_ordering()
         if ordering:
@@ -202,30 +228,13 @@ class MyincoAdminOrderListView(ListView, CreateView):
         ).count()
 
         # 서비스
-        policys = ServicePolicyPriceOption.objects.all()
-        policy_dict = {
-            policy.product_name: list(
-                filter(
-                    lambda x: x.product_name == policy.product_name, policys
-                )
-            )
-            for policy in policys
-        }
-
-        # policy_dict = {}
-        # for policy in policys:
-        #     if policy.product_name in policy_dict:
-        #         policy_dict[policy.product_name].append(policy)
-        #     else:
-        #         policy_dict[policy.product_name] = [policy]
-
-        data["policys"] = policy_dict
+        data["policys"] = get_catalog().by_product
         data["organizations"] = Organization.objects.filter(is_deleted=False)
 
         objects = data["object_list"]
         data["total_object_list"] = data["object_list"]
         p = Paginator(objects, 10)
-        data["object_list"] = p.page(1)
+        data["object_list"] = attach_total_sales(p.page(1))
         data["page"] = 1
 
         return data
@@ -244,11 +253,11 @@ class MyincoAdminOrderListView(ListView, CreateView):
             status_code="500",
         )
 
-        if input_service:
-            services = json.loads(input_service)
+        services = json.loads(input_service) if input_service else []
 
         # purchaser_organization = request.POST.get('purchaser_organization')
         # organization = Organization.objects.get(id=purchaser_organization)
+        user = customer = None
         if request.POST.get("input_order_type") == "0":
             target_user = User.objects.get(id=purchaser_user)
         elif request.POST.get("input_order_type") == "1":
@@ -266,122 +275,116 @@ class MyincoAdminOrderListView(ListView, CreateView):
         elif input_order_type == "2":  # 관련 주문
             order_type = "division"
 
+        # 주문, 주문 서비스, 로그는 한 트랜잭션으로 생성 / 메일은 커밋 이후 발송
+        # 주문번호 잠금은 커밋 직후 (메일 발송 전) 또는 롤백 시 해제
+        # 관련 주문은 상위 주문 row 잠금으로 직렬화
         if order_type == "division":
-            parent_order = Order.objects.get(
-                id=request.POST.get("input_order")
-            )
-            order = Order.objects.create(
+            order_transaction = transaction.atomic()
+        else:
+            order_transaction = order_identifier_lock("solution", order_type)
+        try:
+            with order_transaction:
+                order = self.create_order(
+                    request, order_type, user, customer, services
+                )
+                self.finish_order_creation(request, order, default_log)
+        except (
+            OrderIdentifierError,
+            ServicePolicyPriceOption.DoesNotExist,
+            KeyError,
+            ValueError,
+        ) as e:
+            self.object = None
+            self.object_list = self.get_queryset()
+            context = self.get_context_data()
+            if isinstance(e, OrderIdentifierError):
+                context["errors"] = str(e)
+            else:
+                context["errors"] = "주문 서비스 정보를 확인해주세요."
+            return self.render_to_response(context)
+
+        return HttpResponseRedirect(reverse_lazy("myinco_admin-order-list"))
+
+    def create_order(self, request, order_type, user, customer, services):
+        """
+        주문번호 발급 후 주문, 주문 서비스 생성
+        * division 은 transaction.atomic, 그 외는 order_identifier_lock 안에서 호출
+        """
+        if order_type == "division":
+            parent_order = lock_order(request.POST.get("input_order"))
+            return Order.objects.create(
                 order_type=order_type,
-                identifier=parent_order.get_expected_number(),
+                identifier=allocate_division_identifier(parent_order),
                 purchaser_user=parent_order.purchaser_user,
                 purchaser_customer=parent_order.purchaser_customer,
                 payment_method=parent_order.payment_method,
                 parent=parent_order,
             )
-            if order:
-                order.manager.add(self.request.user)
-                OrderLog.objects.create(
-                    order=order,
-                    to_status="estimate-request",
-                    mtime=datetime.datetime.now(),
-                    user=self.request.user,
-                )
 
-                make_system_log(
-                    order,
-                    "솔루션 주문",
-                    request.environ["PATH_INFO"],
-                    request.user,
-                    "create",
-                    identifier=order.id,
-                    default_log=default_log,
-                )
-
-                if order.purchaser_user:
-                    target = order.purchaser_user.username
-                    name = order.purchaser_user.profile.name
-                elif order.purchaser_customer:
-                    target = order.purchaser_customer.email
-                    name = order.purchaser_customer.name
-
-                content = "서비스 견적을 요청했어요."
-                send_auto_email(
-                    client_info=order,
-                    email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                    email_template="myinco_admin/order/order_email.html",
-                    to_email=target,
-                    sub_title=content,
-                )
-
-                return HttpResponseRedirect(
-                    reverse_lazy("myinco_admin-order-list")
-                )
-        else:
-            identifier = generate_order_identifier(
-                    service_type='solution', order_type=order_type)
-
-            order = Order.objects.create(
-                order_type=order_type,
-                identifier=identifier,
-                purchaser_user=user,
-                purchaser_customer=customer,
-                payment_method="manager",
-            )
-
-            for service in services:
-                policy_option = ServicePolicyPriceOption.objects.get(
-                    id=service["id"]
-                )
+        order = Order.objects.create(
+            order_type=order_type,
+            identifier=allocate_order_identifier("solution", order_type),
+            purchaser_user=user,
+            purchaser_customer=customer,
+            payment_method="manager",
+        )
+        create_order_carts(order, services)
+        return order
 
-                OrderCart.objects.create(
-                    order=order,
-                    policy=policy_option,
-                    quantity=int(service["count"]),
-                    price=policy_option.price * int(service["count"]),
-                    # is_ordered=True,
-                )
+    def finish_order_creation(self, request, order, default_log):
+        """담당자, 주문 로그, 시스템 로그 기록 후 안내 메일 예약"""
+        invalidate_sales_totals([order])
 
-            if order:
-                order.manager.add(self.request.user)
-                OrderLog.objects.create(
-                    order=order,
-                    to_status="estimate-request",
-                    mtime=datetime.datetime.now(),
-                    user=self.request.user,
-                )
-                extra_url = reverse_lazy(
-                    "myinco_admin-order-detail", kwargs={"id": order.id}
-                )
-                make_system_log(
-                    order,
-                    "솔루션 주문",
-                    request.environ["PATH_INFO"],
-                    request.user,
-                    "create",
-                    identifier=order.id,
-                    default_log=default_log,
-                    extra_url=extra_url,
-                )
+        order.manager.add(self.request.user)
+        OrderLog.objects.create(
+            order=order,
+            to_status="estimate-request",
+            mtime=datetime.datetime.now(),
+            user=self.request.user,
+        )
+        make_system_log(
+            order,
+            "솔루션 주문",
+            request.environ["PATH_INFO"],
+            request.user,
+            "create",
+            identifier=order.id,
+            default_log=default_log,
+            extra_url=reverse_lazy(
+                "myinco_admin-order-detail", kwargs={"id": order.id}
+            ),
+        )
+        transaction.on_commit(
+            lambda: send_order_email(order, "서비스 견적을 요청했어요.")
+        )
 
-                if order.purchaser_user:
-                    target = order.purchaser_user.username
-                    name = order.purchaser_user.profile.name
-                elif order.purchaser_customer:
-                    target = order.purchaser_customer.email
-                    name = order.purchaser_customer.name
-
-                content = "서비스 견적을 요청했어요."
-                send_auto_email(
-                    client_info=order,
-                    email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                    email_template="myinco_admin/order/order_email.html",
-                    to_email=target,
-                    sub_title=content,
-                )
 
-                return HttpResponseRedirect(
-                    reverse_lazy("myinco_admin-order-list")
-                )
+def create_order_carts(order, services):
+    """
+    주문 서비스 일괄 생성
+    * 가격 옵션은 in_bulk 로 한 번에 조회
+    * 가격은 주문 시점 단가 x 수량으로 고정 저장
+    """
+    options = ServicePolicyPriceOption.objects.in_bulk(
+        [int(service["id"]) for service in services]
+    )
+    carts = []
+    for service in services:
+        policy_option = options.get(int(service["id"]))
+        if policy_option is None:
+            raise ServicePolicyPriceOption.DoesNotExist(
+                f"ServicePolicyPriceOption {service['id']} does not exist."
+            )
+        quantity = int(service["count"])
+        carts.append(
+            OrderCart(
+                order=order,
+                policy=policy_option,
+                quantity=quantity,
+                price=policy_option.price * quantity,
+            )
+        )
+    return OrderCart.objects.bulk_create(carts)
 
 
 def order_page_ajax(request):
@@ -407,30 +410,17 @@ def order_page_ajax(request):
                 purchaser_user__profile__organization__place_name__icontains=keyword  # noqa
             )
             | Q(ordercart__policy__product_name__icontains=keyword)
-            # | Q(ordercart__policy__product_name__get_service_code=keyword)
+            | Q(ordercart__policy__service_code__icontains=keyword)
         )
 
     # 관련주문 제외
     # queryset = queryset.exclude(order_type="division")
     queryset = queryset.filter(is_deleted=False)
 
-    queryset = queryset.annotate(
-        is_bookmarked=Case(
-            When(
-                orderbookmark__user__id=user_id,
-                then=True,
-            ),
-            default=False,
-        )
+    queryset = annotate_bookmarked(
+        queryset.distinct(), "order", user_id
     )
 
-    true_set = queryset.filter(is_bookmarked=True).distinct()
-    ids = true_set.values_list("id", flat=True)
-    false_set = (
-        queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
-    )
-    queryset = true_set | false_set
-
     ordering = ("-ctime",)
     if ordering:
         if isinstance(ordering, str):
@@ -439,7 +429,7 @@ def order_page_ajax(request):
 
     try:
         p = Paginator(queryset, 10)
-        queryset = p.page(int(page))
+        queryset = attach_total_sales(p.page(int(page)))
 
         context = {"object_list": queryset, "page": int(page)}
 
@@ -465,36 +455,20 @@ def bookmark_ajax(request):
     order = request.POST.get("order")
     status = True if request.POST.get("status") == "true" else False
 
-    bookmarks = OrderBookmark.objects.filter(
-        order=Order.objects.get(identifier=order),
-        user=User.objects.get(id=user),
-    )
+    order_id = Order.objects.values_list("id", flat=True).get(identifier=order)
 
+    # status : 현재 즐겨찾기 여부 (false 면 추가)
     if not status:
-        if bookmarks:
+        if not toggle_bookmark("order", user, order_id, add=True):
             return JsonResponse({"data": "bookmark already added"}, status=200)
-        else:
-            OrderBookmark.objects.create(
-                order=Order.objects.get(identifier=order),
-                user=User.objects.get(id=user),
-            )
-            return JsonResponse({"data": "bookmark added"}, status=200)
+        return JsonResponse({"data": "bookmark added"}, status=200)
 
     else:
-        if not bookmarks:
+        if not toggle_bookmark("order", user, order_id, add=False):
             return JsonResponse(
                 {"data": "bookmark already removed"}, status=200
             )
-        else:
-            OrderBookmark.objects.get(
-                order=Order.objects.get(identifier=order),
-                user=User.objects.get(id=user),
-            ).delete()
-            bookmarks = OrderBookmark.objects.filter(
-                order=Order.objects.get(identifier=order),
-                user=User.objects.get(id=user),
-            )
-            return JsonResponse({"data": "bookmark removed"}, status=200)
+        return JsonResponse({"data": "bookmark removed"}, status=200)
 
 
 class MyincoAdminOrderDetailView(DetailView):
@@ -504,11 +478,19 @@ class MyincoAdminOrderDetailView(DetailView):
 
     def get_table_data(self):
         table_data = []
-        for index, ordercart in enumerate(self.object.ordercart_set.all()):
+        ordercart_set = self.object.ordercart_set.select_related(
+            "policy").prefetch_related("policy__options__group_code")
+        for index, ordercart in enumerate(ordercart_set):
             row = []
             row.append(index + 1)
             row.append(ordercart.policy.product_name)
-            row.append("CODE:" + ordercart.policy.get_service_code())
+            row.append(
+                "CODE:"
+                + (
+                    ordercart.policy.service_code
+                    or ordercart.policy.get_service_code()
+                )
+            )
             row.append(ordercart.quantity)
             row.append(ordercart.price)
             row.append(ordercart.quantity * ordercart.price)
@@ -608,16 +590,10 @@ class MyincoAdminOrderDetailView(DetailView):
         data["quotation_data"] = self.get_table_data()
 
         # set existing quotation information
-        quotations = self.object.quotation_set.all().order_by("-ctime")
-        data["quotations"] = quotations
-        quotation_form_list = []
-        for each in quotations:
-            each.context = mark_safe(json.dumps(each.context))
-            each.remarks = mark_safe(json.dumps(each.remarks))
-            update_quotation_form = QuotationForm(instance=each)
-            quotation_form_list.append((update_quotation_form, each))
-
-        data["quotation_form_list"] = quotation_form_list
+        # 시트(context, remarks)는 quotation_sheet_ajax 로 견적서별 조회
+        data["quotations"] = self.object.quotation_set.defer(
+            *QUOTATION_SHEET_FIELDS
+        ).order_by("-ctime")
         data["order_form"] = order_form
 
         try:
@@ -644,64 +620,26 @@ class MyincoAdminOrderDetailView(DetailView):
             data["errors"] = self.kwargs["errors"]
         return data
 
+    @transaction.atomic
     def change_order_setting(self, request, *args, **kwargs):
-        order = Order.objects.get(id=request.POST.get("order_id"))
+        order = lock_order(request.POST.get("order_id"))
         before_order = copy.deepcopy(order)
         if request.POST.get("order-cancel") == "true":
-            print("주문 취소")
-            default_log = SystemLog.objects.create(
-                page_name="솔루션 주문",
-                url=self.request.environ["PATH_INFO"],
-                user=self.request.user,
-                method="update",
-                status_code="500",
-            )
-            order.status = "order-cancel"
-            order.save()
-            etc = [["status", "order-cancel"]]
-            make_system_log(
-                before_order,
-                "솔루션 주문",
-                request.environ["PATH_INFO"],
+            # 주문 취소
+            transition_order(
+                order,
+                "order-cancel",
                 request.user,
-                "update",
-                identifier=order.id,
-                etc=etc,
-                default_log=default_log,
+                request.environ["PATH_INFO"],
             )
 
-            # content = "주문이 취소되었어요."
-            # send_auto_email(
-            #     client_info=order,
-            #     email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-            #     email_template="myinco_admin/order/order_email.html",
-            #     to_email=target,
-            #     sub_title=content,
-            # )
-
         elif request.POST.get("order-cancel") == "false":
-            print("주문 복구")
-            default_log = SystemLog.objects.create(
-                page_name="솔루션 주문",
-                url=self.request.environ["PATH_INFO"],
-                user=self.request.user,
-                method="update",
-                status_code="500",
-            )
-
-            order.status = "estimate-request"
-            order.save()
-
-            etc = [["status", "estimate-request"]]
-            make_system_log(
-                before_order,
-                "솔루션 주문",
-                request.environ["PATH_INFO"],
+            # 주문 복구
+            transition_order(
+                order,
+                "estimate-request",
                 request.user,
-                "update",
-                identifier=order.id,
-                etc=etc,
-                default_log=default_log,
+                request.environ["PATH_INFO"],
             )
 
         if request.POST.get("order_publish") == "false":
@@ -761,6 +699,7 @@ class MyincoAdminOrderDetailView(DetailView):
             + "?tab=0"
         )  # noqa
 
+    @transaction.atomic
     def change_order_status(self, request, *args, **kwargs):
         default_log = SystemLog.objects.create(
             page_name="솔루션 주문",
@@ -772,10 +711,10 @@ class MyincoAdminOrderDetailView(DetailView):
         status = request.POST.get("status")
         manager_ids = request.POST.getlist("manager")
 
-        order = Order.objects.get(id=kwargs["id"])
+        order = lock_order(kwargs["id"])
         before_order = copy.deepcopy(order)
 
-        etc = [["manager", manager_ids], ["status", status]]
+        etc = [["manager", manager_ids]]
         system_log = make_system_log(
             before_order,
             "솔루션 주문",
@@ -788,65 +727,36 @@ class MyincoAdminOrderDetailView(DetailView):
             default_log=default_log,
         )
 
-        order.manager.clear()
-
-        manager_name = []
-        order.status = status
-        for manager_obj in User.objects.filter(id__in=manager_ids):
-            # manager_obj = User.objects.get(id=manager_id)
-            order.manager.add(manager_obj)
-            manager_name.append(manager_obj.username)
-        order.save()
-
+        managers = User.objects.filter(id__in=manager_ids)
+        order.manager.set(managers)
         diff = "담당자("
-        for each in manager_name:
-            diff += each + ","
+        for each in managers:
+            diff += each.username + ","
         diff += ")"
 
-        OrderLog.objects.create(
-            order=order,
-            to_status=order.status,
-            mtime=datetime.datetime.now(),
-            diff=diff,
-            user=User.objects.get(id=self.request.user.id),
+        # 상태 변경 시 주문 로그, 시스템 로그, 안내 메일은 transition_order 에서 처리
+        # 담당자 변경이 없으면 default_log 는 상태 변경 로그로 완료
+        transition = transition_order(
+            order,
+            status,
+            request.user,
+            request.environ["PATH_INFO"],
+            default_log=None if system_log else default_log,
+            order_log_diff=diff,
+            email=True,
         )
 
-        # 성공시
+        # 담당자만 변경된 경우
         if system_log:
             system_log.save_with_url()
-            if order.purchaser_user:
-                target = order.purchaser_user.username
-                name = order.purchaser_user.profile.name
-            elif order.purchaser_customer:
-                target = order.purchaser_customer.email
-                name = order.purchaser_customer.name
-
-            if status == "estimate-request":
-                content = "서비스 견적이 요청되었어요."
-            elif status == "request-cancel":
-                content = "서비스 견적요청을 취소되했어요."
-            elif status == "estimate-complete":
-                content = "서비스 견적이 완료되었어요."
-            elif status == "estimate-re-request":
-                content = "서비스 재견적을 요청했어요."
-            elif status == "estimate-expire":
-                content = "서비스 견적이 만료되었어요."
-            elif status == "payment-request":
-                content = "서비스 결제가 요청되었어요."
-            elif status == "payment-cancel":
-                content = "서비스 결제가 취소되었어요."
-            elif status == "payment-complete":
-                content = "서비스 결제가 완료되었어요."
-            elif status == "order-cancel":
-                content = "서비스 주문이 취소되었어요."
-
-            send_auto_email(
-                client_info=order,
-                email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                email_template="myinco_admin/order/order_email.html",
-                to_email=target,
-                sub_title=content,
-            )
+            if not transition:
+                OrderLog.objects.create(
+                    order=order,
+                    to_status=order.status,
+                    mtime=datetime.datetime.now(),
+                    diff=diff,
+                    user=request.user,
+                )
 
         return HttpResponseRedirect(
             reverse_lazy(
@@ -857,6 +767,8 @@ class MyincoAdminOrderDetailView(DetailView):
 
     @transaction.atomic
     def save_quotation_form(self, request, *args, **kwargs):
+        # 주문 잠금 후 기존 견적서와 비교 (중복 제출 방지)
+        order = lock_order(kwargs["id"])
         default_log = SystemLog.objects.create(
             page_name="솔루션 주문",
             url=self.request.environ["PATH_INFO"],
@@ -864,8 +776,6 @@ class MyincoAdminOrderDetailView(DetailView):
             method="update",
             status_code="500",
         )
-        order = Order.objects.get(id=kwargs["id"])
-        # before_order = copy.deepcopy(order)
         sheet = request.POST.get("sheet")
         sheet = json.loads(sheet)
         sheet_arr = []
@@ -917,23 +827,15 @@ class MyincoAdminOrderDetailView(DetailView):
                 except PurchaseOrder.DoesNotExist:
                     purchase_order = None
                 if purchase_order:
-                    before_order = copy.deepcopy(order)
                     extra_content = (
                         f"{purchase_order.file_name} 발주서 삭제"  # noqa
                     )
                     purchase_order.delete()
-                    order.status = "estimate-re-request"
-                    order.save()
-
-                    etc = [["status", "estimate-re-request"]]
-                    make_system_log(
-                        before_order,
-                        "솔루션 주문",
-                        request.environ["PATH_INFO"],
+                    transition_order(
+                        order,
+                        "estimate-re-request",
                         request.user,
-                        "update",
-                        identifier=order.id,
-                        etc=etc,
+                        request.environ["PATH_INFO"],
                         default_log=default_purchase_log,
                         extra_content=extra_content,
                         extra_url=reverse_lazy(
@@ -941,21 +843,8 @@ class MyincoAdminOrderDetailView(DetailView):
                             kwargs={"id": order.id},
                         ),
                     )
-
-                    if order.purchaser_user:
-                        target = order.purchaser_user.username
-                        name = order.purchaser_user.profile.name
-                    elif order.purchaser_customer:
-                        target = order.purchaser_customer.email
-                        name = order.purchaser_customer.name
-
-                    send_auto_email(
-                        client_info=order,
-                        email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                        email_template="myinco_admin/order/order_email.html",
-                        to_email=target,
-                        sub_title="서비스 재견적을 요청했어요.",
-                    )
+                    # 발주서 삭제 안내는 상태 변경 여부와 무관하게 발송
+                    notify_order(order, STATUS_MESSAGES["estimate-re-request"])
 
                 # 견적서 공개 변경 시 결제 삭제
 
@@ -992,14 +881,14 @@ class MyincoAdminOrderDetailView(DetailView):
             try:
                 is_published = request.POST.get("is_published")
                 if is_published:
-                    order.status = "estimate-complete"
+                    order_status = "estimate-complete"
                     # order.quotation_set.all().update(is_published=False)
                     if is_published == "True":
                         is_published = True
                     else:
                         is_published = False
                 else:
-                    order.status = "estimate-request"
+                    order_status = "estimate-request"
                 # quotation.update(**data_dict)
                 quotation.order = order
                 quotation.name = request.POST.get("name")
@@ -1024,28 +913,22 @@ class MyincoAdminOrderDetailView(DetailView):
                 quotation.final_price = request.POST.get("final_price")
 
                 quotation.save()
+                quotation.refresh_from_db()
+                quotation_changed = any(
+                    getattr(before_quotation, field)
+                    != getattr(quotation, field)
+                    for field in QUOTATION_EVENT_FIELDS
+                )
 
-                order.save()
-
-                if order.purchaser_user:
-                    target = order.purchaser_user.username
-                    name = order.purchaser_user.profile.name
-                elif order.purchaser_customer:
-                    target = order.purchaser_customer.email
-                    name = order.purchaser_customer.name
-
-                if order.status == "estimate-request":
-                    content = "서비스 견적이 요청되었어요."
-                elif order.status == "estimate-complete":
-                    content = "서비스 견적이 완료되었어요."
-
-                send_auto_email(
-                    client_info=order,
-                    email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                    email_template="myinco_admin/order/order_email.html",
-                    to_email=target,
-                    sub_title=content,
+                transition_order(
+                    order,
+                    order_status,
+                    request.user,
+                    request.environ["PATH_INFO"],
                 )
+                # 견적서 수정/재공개 안내는 같은 상태여도 발송 (같은 값 재제출 제외)
+                if quotation_changed:
+                    notify_order(order, STATUS_MESSAGES[order_status])
 
             except PDFError as e:
                 # PDF 생성 오류 시에 대한 로직 추가 필요
@@ -1068,6 +951,18 @@ class MyincoAdminOrderDetailView(DetailView):
                 info = {"quotation": "create"}
                 raise QuotationError(error_msg, info=info)
 
+            if not quotation_changed:
+                complete_system_log(
+                    before_quotation,
+                    "솔루션 주문 - 견적관리",
+                    request.environ["PATH_INFO"],
+                    request.user,
+                    "update",
+                    identifier=before_quotation.id,
+                    default_log=default_log,
+                )
+                return quotation.pk
+
             etc = list(data_dict.items())
             make_system_log(
                 before_quotation,
@@ -1083,6 +978,30 @@ class MyincoAdminOrderDetailView(DetailView):
             """
             Quotation create
             """
+            # 같은 내용의 견적서가 방금 생성된 경우 (중복 제출) 기존 견적서 사용
+            duplicate = (
+                order.quotation_set.filter(
+                    name=request.POST.get("name"),
+                    manager=manager,
+                    final_price=request.POST.get("final_price"),
+                    ctime__gte=datetime.datetime.now()
+                    - datetime.timedelta(seconds=DUPLICATE_REQUEST_SECONDS),
+                )
+                .order_by("-ctime")
+                .first()
+            )
+            if duplicate and duplicate.context == sheet_json:
+                complete_system_log(
+                    duplicate,
+                    "솔루션 주문 - 견적관리",
+                    request.environ["PATH_INFO"],
+                    request.user,
+                    "create",
+                    identifier=duplicate.id,
+                    extra_content="솔루션 주문 - 견적관리 중복 요청",
+                    default_log=default_log,
+                )
+                return duplicate.pk
             try:
                 print("==============", sheet_json.__class__)
                 quotation = Quotation.objects.create(
@@ -1153,7 +1072,13 @@ class MyincoAdminOrderDetailView(DetailView):
             return self.change_order_setting(request, *args, **kwargs)
 
         elif request.POST.get("form_type") == "order_status":
-            return self.change_order_status(request, *args, **kwargs)
+            try:
+                return self.change_order_status(request, *args, **kwargs)
+            except OrderTransitionError as e:
+                self.object = self.get_object()
+                context = self.get_context_data()
+                context["errors"] = str(e)
+                return self.render_to_response(context)
 
         elif request.POST.get("form_type") == "quotation_form":
             try:
@@ -1197,16 +1122,15 @@ def quotation_update_modal(request, id):
     quotation.remarks = mark_safe(json.dumps(quotation.remarks))
     update_quotation_form = QuotationForm(instance=quotation)
 
-    quotations = order.quotation_set.all().order_by("-ctime")
-
-    quotation_form_list = []
-    for each in quotations:
-        each.context = mark_safe(json.dumps(each.context))
-        each.remarks = mark_safe(json.dumps(each.remarks))
-        quotation_form_list.append(each)
+    quotations = order.quotation_set.defer(*QUOTATION_SHEET_FIELDS).order_by(
+        "-ctime"
+    )
 
+    # 시트(context, remarks)가 제외된 목록, 시트는 quotation_sheet_ajax 로 조회
+    # 모달 템플릿은 기존 quotation_form_list 키 사용 (상세 화면과 같은 quotations 도 전달)
     context = {
-        "quotation_form_list": quotation_form_list,
+        "quotation_form_list": quotations,
+        "quotations": quotations,
         "object": order,
         "quotation": quotation,
         "user": request.user,
@@ -1222,6 +1146,142 @@ def quotation_update_modal(request, id):
     )
 
 
+def quotation_sheet_ajax(request, id):
+    """
+    견적서 시트(context, remarks) 단건 조회
+    * ETag 가 같으면 304 반환
+    """
+    quotation_id = request.GET.get("quotation_id")
+    try:
+        quotation = Quotation.objects.only(
+            "id", "order_id", *QUOTATION_SHEET_FIELDS
+        ).get(id=quotation_id, order_id=id)
+    except (Quotation.DoesNotExist, ValueError):
+        return JsonResponse({"status": False}, status=404)
+
+    body = json.dumps(
+        {
+            "data": {
+                "id": quotation.id,
+                "context": quotation.context,
+                "remarks": quotation.remarks,
+            },
+            "status": True,
+        }
+    )
+    etag = '"{}"'.format(hashlib.md5(body.encode("utf-8")).hexdigest())
+    if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def quotation_revision_ajax(request, id):
+    """
+    견적서 시트 이력 조회
+    * revision 미지정 : 시트 변경 이력(SystemLog) 목록과 행 단위 변경분
+    * revision 지정 : 해당 이력 적용 직후의 시트를 현재 시트에서 역으로 복원
+      (context, remarks 모두 {"data": 행 목록, ...} 형식)
+    """
+    quotation_id = request.GET.get("quotation_id")
+    try:
+        quotation = Quotation.objects.only(
+            "id", "order_id", *QUOTATION_SHEET_FIELDS
+        ).get(id=quotation_id, order_id=id)
+    except (Quotation.DoesNotExist, ValueError):
+        return JsonResponse({"status": False}, status=404)
+
+    logs = SystemLog.objects.filter(
+        model="Quotation",
+        model_identifier=quotation.id,
+        method="update",
+    ).order_by("-id")
+    revisions = [
+        {
+            "id": log.id,
+            "user": log.user.profile.name if log.user else "",
+            "diff": {
+                key: log.diff[key]
+                for key in QUOTATION_SHEET_FIELDS
+                if key in log.diff
+            },
+        }
+        for log in logs.select_related("user__profile")
+        if log.diff
+        and any(key in log.diff for key in QUOTATION_SHEET_FIELDS)
+    ]
+
+    revision = request.GET.get("revision")
+    if not revision:
+        return JsonResponse({"data": revisions, "status": True})
+    try:
+        revision = int(revision)
+    except ValueError:
+        return JsonResponse({"data": "잘못된 조회 조건입니다."}, status=400)
+
+    sheets = {
+        key: get_sheet_rows(getattr(quotation, key))
+        for key in QUOTATION_SHEET_FIELDS
+    }
+    for each in revisions:
+        if each["id"] <= revision:
+            break
+        for key, delta in each["diff"].items():
+            sheets[key] = revert_sheet_delta(sheets[key], delta)
+    return JsonResponse(
+        {
+            "data": {
+                "id": quotation.id,
+                "revision": revision,
+                **{
+                    key: get_sheet_section(getattr(quotation, key), rows)
+                    for key, rows in sheets.items()
+                },
+            },
+            "status": True,
+        }
+    )
+
+
+def order_bulk_update_ajax(request):
+    """
+    주문 일괄 변경 (상태, 담당자, 공개 여부)
+    * order_ids : 주문 id 목록
+    * status / manager / is_active 중 전달된 항목만 변경
+    """
+    try:
+        order_ids = [int(value) for value in request.POST.getlist("order_ids")]
+        manager_ids = (
+            [int(value) for value in request.POST.getlist("manager")]
+            if request.POST.get("change_manager") == "true"
+            else None
+        )
+    except ValueError:
+        return JsonResponse({"data": "잘못된 요청입니다."}, status=400)
+    status = request.POST.get("status") or None
+    is_active = request.POST.get("is_active")
+    if is_active is not None:
+        is_active = is_active == "true"
+
+    if not order_ids:
+        return JsonResponse({"data": "선택된 주문이 없습니다."}, status=400)
+    try:
+        results = bulk_update_orders(
+            order_ids,
+            request.user,
+            status=status,
+            manager_ids=manager_ids,
+            is_active=is_active,
+        )
+    except OrderTransitionError as e:
+        return JsonResponse({"data": str(e)}, status=400)
+    return JsonResponse({"data": results, "status": True}, status=200)
+
+
+@transaction.atomic
 def PurchaseattachmentAjax(request):
     status = True if request.POST.get("status") == "true" else False
     attachment = request.FILES.get("attachment")
@@ -1237,8 +1297,7 @@ def PurchaseattachmentAjax(request):
         status_code="500",
     )
 
-    order = Order.objects.get(id=order_id)
-    before_order = copy.deepcopy(order)
+    order = lock_order(order_id)
     quotation = Quotation.objects.filter(order=order, is_published=True)
 
     if len(quotation) == 0:
@@ -1263,20 +1322,13 @@ def PurchaseattachmentAjax(request):
                 file_size=file_size,
             )
 
-            order.status = "payment-wating"
-            order.save()
-
             if purchase_order:
                 extra_content = f"{purchase_order.file_name} 발주서 등록"  # noqa
-                etc = [["status", "payment-wating"]]
-                make_system_log(
-                    before_order,
-                    "솔루션 주문",
-                    request.environ["PATH_INFO"],
+                transition_order(
+                    order,
+                    "payment-wating",
                     request.user,
-                    "update",
-                    identifier=order.id,
-                    etc=etc,
+                    request.environ["PATH_INFO"],
                     default_log=default_log,
                     extra_content=extra_content,
                     extra_url=reverse_lazy(
@@ -1303,18 +1355,11 @@ def PurchaseattachmentAjax(request):
         if purchase_order:
             extra_content = f"{purchase_order.file_name} 발주서 삭제"  # noqa
             purchase_order.delete()
-            order.status = "estimate-re-request"
-            order.save()
-
-            etc = [["status", "estimate-re-request"]]
-            make_system_log(
-                before_order,
-                "솔루션 주문",
-                request.environ["PATH_INFO"],
+            transition_order(
+                order,
+                "estimate-re-request",
                 request.user,
-                "update",
-                identifier=order.id,
-                etc=etc,
+                request.environ["PATH_INFO"],
                 default_log=default_log,
                 extra_content=extra_content,
                 extra_url=reverse_lazy(
@@ -1332,22 +1377,14 @@ def PurchaseattachmentAjax(request):
             return JsonResponse({"data": "fail"}, status=200)
 
 
+@transaction.atomic
 def PaymentattachmentAjax(request):
     order_id = request.POST.get("order_id")
     user_id = request.POST.get("user_id")
 
-    order = Order.objects.get(id=order_id)
-    before_order = copy.deepcopy(order)
+    order = lock_order(order_id)
     quotation = Quotation.objects.filter(order=order, is_published=True)
 
-    default_log = SystemLog.objects.create(
-        page_name="솔루션 주문",
-        url=request.environ["PATH_INFO"],
-        user=request.user,
-        method="update",
-        status_code="500",
-    )
-
     if len(quotation) == 0:
         return JsonResponse({"data": "Quotations is None"}, status=400)
     else:
@@ -1408,43 +1445,51 @@ def PaymentattachmentAjax(request):
             }
         )
 
+    # 주문 잠금 안에서 같은 내용의 결제처리가 방금 등록됐는지 확인 (중복 클릭)
+    duplicate = Payment.objects.filter(
+        ctime__gte=datetime.datetime.now()
+        - datetime.timedelta(seconds=DUPLICATE_REQUEST_SECONDS),
+        **{
+            key: value
+            for key, value in data.items()
+            if key not in ("token", "certificate")
+        },
+    ).exists()
+    if duplicate:
+        return JsonResponse(
+            {"data": "success", "duplicate": True}, status=200
+        )
+
+    default_log = SystemLog.objects.create(
+        page_name="솔루션 주문",
+        url=request.environ["PATH_INFO"],
+        user=request.user,
+        method="update",
+        status_code="500",
+    )
     payment = Payment.objects.create(**data)
     if payment:
-        order.status = "payment-request"
-        order.save()
-        etc = [["status", "payment-request"]]
         extra_content = (
             f"결제처리({payment.get_payment_method_display()}) 등록"  # noqa
         )
-        make_system_log(
-            before_order,
-            "솔루션 주문",
-            request.environ["PATH_INFO"],
+        transition_order(
+            order,
+            "payment-request",
             request.user,
-            "update",
-            identifier=before_order.id,
-            etc=etc,
-            extra_content=extra_content,
+            request.environ["PATH_INFO"],
             default_log=default_log,
+            extra_content=extra_content,
             extra_url=reverse_lazy(
                 "myinco_admin-order-detail",
                 kwargs={"id": order.id},
             ),
         )
-        if order.purchaser_user:
-            target = order.purchaser_user.username
-            name = order.purchaser_user.profile.name
-        elif order.purchaser_customer:
-            target = order.purchaser_customer.email
-            name = order.purchaser_customer.name
-
-        content = "결제가 요청되었어요."
-        send_auto_email(
+        # 결제처리 등록 안내는 상태 변경 여부와 무관하게 발송
+        notify_order(
+            order,
+            "결제가 요청되었어요.",
             client_info=payment,
-            email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-            email_template="myinco_admin/order/payment_email.html",
-            to_email=target,
-            sub_title=content,
+            email_template=PAYMENT_EMAIL_TEMPLATE,
         )
         return JsonResponse({"data": "success"}, status=200)
     else:
@@ -1453,13 +1498,13 @@ def PaymentattachmentAjax(request):
     # status = True if request.POST.get("status") == "true" else False
 
 
+@transaction.atomic
 def PaymentattApplyAjax(request):
     status = True if request.POST.get("status") == "true" else False
     payment_id = request.POST.get("payment_id")
     order_id = request.POST.get("order_id")
 
-    order = Order.objects.get(id=order_id)
-    before_order = copy.deepcopy(order)
+    order = lock_order(order_id)
     payment = Payment.objects.get(id=payment_id)
     active_payments = Payment.objects.filter(order=order, is_payment=True)
 
@@ -1485,54 +1530,39 @@ def PaymentattApplyAjax(request):
             payment.is_payment = True
             payment.tax_status = "completed"
             payment.save()
+            invalidate_sales_totals([order])
 
-            order.status = "payment-complete"
-            order.save()
-
-            ctime = payment.ctime
-            context = {
-                "tax_manager_name": payment.tax_manager.profile.name,
-                "ctime": f'{ctime.strftime("%Y년 %m월 %d일")}',
-                "tax_email": payment.tax_email,
-                "payment_id": payment.id,
-                "payment_status": payment.get_tax_status_display(),
-                "order_status": order.status,
-            }
-            etc = [["status", "payment-complete"]]
             extra_content = (
                 f"결제처리({payment.get_payment_method_display()}) 발행"  # noqa
             )
-            make_system_log(
-                before_order,
-                "솔루션 주문",
-                request.environ["PATH_INFO"],
+            transition_order(
+                order,
+                "payment-complete",
                 request.user,
-                "update",
-                identifier=before_order.id,
-                etc=etc,
-                extra_content=extra_content,
+                request.environ["PATH_INFO"],
                 default_log=default_log,
+                extra_content=extra_content,
                 extra_url=reverse_lazy(
                     "myinco_admin-order-detail",
                     kwargs={"id": order.id},
                 ),
             )
-
-            if order.purchaser_user:
-                target = order.purchaser_user.username
-                name = order.purchaser_user.profile.name
-            elif order.purchaser_customer:
-                target = order.purchaser_customer.email
-                name = order.purchaser_customer.name
-
-            content = "결제가 완료되었어요."
-            send_auto_email(
+            notify_order(
+                order,
+                "결제가 완료되었어요.",
                 client_info=payment,
-                email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                email_template="myinco_admin/order/payment_email.html",
-                to_email=target,
-                sub_title=content,
+                email_template=PAYMENT_EMAIL_TEMPLATE,
             )
+
+            ctime = payment.ctime
+            context = {
+                "tax_manager_name": payment.tax_manager.profile.name,
+                "ctime": f'{ctime.strftime("%Y년 %m월 %d일")}',
+                "tax_email": payment.tax_email,
+                "payment_id": payment.id,
+                "payment_status": payment.get_tax_status_display(),
+                "order_status": order.status,
+            }
             return JsonResponse({"data": json.dumps(context)}, status=200)
     else:
         completes = order.payment_set.filter(is_payment=True)
@@ -1556,45 +1586,29 @@ def PaymentattApplyAjax(request):
             payment.is_payment = False
             payment.tax_status = "canceled"
             payment.save()
-
-            order.status = "payment-wating"
-            order.save()
+            invalidate_sales_totals([order])
 
             ctime = payment.ctime
-            etc = [["status", "payment-wating"]]
             extra_content = (
                 f"결제처리({payment.get_payment_method_display()}) 발행취소"  # noqa
             )
-            make_system_log(
-                before_order,
-                "솔루션 주문",
-                request.environ["PATH_INFO"],
+            transition_order(
+                order,
+                "payment-wating",
                 request.user,
-                "update",
-                identifier=before_order.id,
-                etc=etc,
-                extra_content=extra_content,
+                request.environ["PATH_INFO"],
                 default_log=default_log,
+                extra_content=extra_content,
                 extra_url=reverse_lazy(
                     "myinco_admin-order-detail",
                     kwargs={"id": order.id},
                 ),
             )
-
-            if order.purchaser_user:
-                target = order.purchaser_user.username
-                name = order.purchaser_user.profile.name
-            elif order.purchaser_customer:
-                target = order.purchaser_customer.email
-                name = order.purchaser_customer.name
-
-            content = "결제가 취소되었어요."
-            send_auto_email(
+            notify_order(
+                order,
+                "결제가 취소되었어요.",
                 client_info=payment,
-                email_subject=f"[(주)인실리코젠] {name}님, 요청하신 주문의 변경사항 안내 드립니다.",
-                email_template="myinco_admin/order/payment_email.html",
-                to_email=target,
-                sub_title=content,
+                email_template=PAYMENT_EMAIL_TEMPLATE,
             )
             context = {
                 "tax_manager_name": payment.tax_manager.profile.name,
@@ -0,0 +1,124 @@
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+
+from isghome.models import Order
+from isghome.views import generate_order_identifier
+
+
+"""
+주문번호 발급
+* generate_order_identifier / get_expected_number 는 기존 주문을 조회해서
+  다음 번호를 계산하므로 같은 번호 체계끼리는 잠금 안에서만 호출
+* order_identifier_lock 블록이 주문 생성 트랜잭션 (커밋 직후 또는 롤백 시 해제)
+  (with order_identifier_lock(...): 주문/주문 서비스/로그 생성)
+* 관련 주문(division)은 상위 주문 row 잠금(lock_order) 안에서 발급
+* 일괄 등록은 마지막 숫자 구간을 증가시켜 번호 묶음을 한 번에 발급
+"""
+
+IDENTIFIER_LOCK_KEY = "myinco:order-identifier:lock:{}"
+IDENTIFIER_LOCK_TIMEOUT = 30
+IDENTIFIER_LOCK_WAIT = 10
+IDENTIFIER_LOCK_INTERVAL = 0.05
+IDENTIFIER_SEQUENCE_PATTERN = re.compile(r"\d+(?=\D*$)")
+
+
+class OrderIdentifierError(Exception):
+    pass
+
+
+@contextmanager
+def order_identifier_lock(*parts):
+    """
+    번호 체계 단위 잠금 + 트랜잭션 (예: "solution", "online")
+    * 공용 캐시 add 로 획득, 다른 요청이 잡고 있으면 IDENTIFIER_LOCK_WAIT 초까지 대기
+    * 블록 전체가 하나의 트랜잭션 (주문, 주문 서비스, 로그 생성)
+    * 커밋 시 가장 먼저 해제 (이후 등록된 on_commit 작업보다 먼저)
+    * 블록 안 어디서든 예외로 롤백되면 finally 에서 해제
+    * 잠금이 커밋 전에 풀리지 않도록 바깥 트랜잭션 안에서는 사용 불가
+    """
+    if transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "order_identifier_lock 은 트랜잭션 밖에서 사용해야 합니다."
+        )
+    key = IDENTIFIER_LOCK_KEY.format(":".join(str(part) for part in parts))
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + IDENTIFIER_LOCK_WAIT
+    while not cache.add(key, token, IDENTIFIER_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise OrderIdentifierError(
+                "주문번호 발급이 지연되고 있습니다. 잠시 후 다시 시도해주세요."
+            )
+        time.sleep(IDENTIFIER_LOCK_INTERVAL)
+
+    def release():
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    try:
+        with transaction.atomic():
+            transaction.on_commit(release)
+            yield
+    finally:
+        release()
+
+
+def increment_identifier(identifier, step):
+    """주문번호의 마지막 숫자 구간을 step 만큼 증가 (자릿수 유지)"""
+    match = IDENTIFIER_SEQUENCE_PATTERN.search(identifier)
+    if match is None:
+        raise OrderIdentifierError(
+            f"주문번호 형식을 확인할 수 없습니다. ({identifier})"
+        )
+    number = match.group()
+    return (
+        identifier[: match.start()]
+        + str(int(number) + step).zfill(len(number))
+        + identifier[match.end():]
+    )
+
+
+def check_identifiers(identifiers):
+    """이미 사용 중인 번호가 있으면 OrderIdentifierError"""
+    if len(set(identifiers)) != len(identifiers):
+        raise OrderIdentifierError("중복된 주문번호가 발급되었습니다.")
+    used = list(
+        Order.objects.filter(identifier__in=identifiers).values_list(
+            "identifier", flat=True
+        )[:1]
+    )
+    if used:
+        raise OrderIdentifierError(f"이미 사용 중인 주문번호입니다. ({used[0]})")
+    return identifiers
+
+
+def allocate_order_identifier(service_type, order_type):
+    """주문번호 1건 발급 (order_identifier_lock 안에서 호출)"""
+    identifier = generate_order_identifier(
+        service_type=service_type, order_type=order_type
+    )
+    return check_identifiers([identifier])[0]
+
+
+def allocate_order_identifiers(service_type, order_type, count):
+    """
+    주문번호 count 건 발급 (order_identifier_lock 안에서 호출)
+    * 기존 주문 조회는 첫 번호 계산 시 한 번만
+    """
+    if count <= 0:
+        return []
+    first = generate_order_identifier(
+        service_type=service_type, order_type=order_type
+    )
+    return check_identifiers(
+        [first] + [increment_identifier(first, step) for step in range(1, count)]
+    )
+
+
+def allocate_division_identifier(parent_order):
+    """관련 주문 번호 발급 (상위 주문 row 를 잠근 트랜잭션 안에서 호출)"""
+    return check_identifiers([parent_order.get_expected_number()])[0]
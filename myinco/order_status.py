@@ -0,0 +1,390 @@
+import copy
+import datetime
+
+from django.db import transaction
+from django.urls import reverse_lazy
+
+from isghome.views import send_auto_email
+from isghome.models import User, Order, OrderLog, SystemLog
+from isghome.views.myinco.util import (
+    make_system_log,
+    complete_system_log,
+    invalidate_sales_totals,
+)
+from isghome.views.myinco.dashboard import invalidate_rollup_days
+
+
+"""
+주문 상태 변경
+* 주문 row 를 select_for_update 로 잠근 뒤 상태 변경
+* 이미 같은 상태인 경우 상태/주문 로그는 그대로 (중복 클릭, 중복 메일 방지)
+* 주문 로그/시스템 로그는 같은 트랜잭션에서, 메일은 커밋 이후 발송
+* 결제 등록, 견적서 수정 등 이벤트 안내 메일은 상태 변경과 별개로 notify_order
+  (이벤트 자체의 중복은 각 화면에서 주문 잠금 후 기존 기록으로 확인)
+"""
+
+ORDER_PAGE_NAME = "솔루션 주문"
+ORDER_EMAIL_SUBJECT = "[(주)인실리코젠] {}님, 요청하신 주문의 변경사항 안내 드립니다."
+ORDER_EMAIL_TEMPLATE = "myinco_admin/order/order_email.html"
+PAYMENT_EMAIL_TEMPLATE = "myinco_admin/order/payment_email.html"
+
+# 상태별 고객 안내 문구
+STATUS_MESSAGES = {
+    "estimate-request": "서비스 견적이 요청되었어요.",
+    "request-cancel": "서비스 견적요청을 취소되했어요.",
+    "estimate-complete": "서비스 견적이 완료되었어요.",
+    "estimate-re-request": "서비스 재견적을 요청했어요.",
+    "estimate-expire": "서비스 견적이 만료되었어요.",
+    "payment-request": "서비스 결제가 요청되었어요.",
+    "payment-wating": "",
+    "payment-cancel": "서비스 결제가 취소되었어요.",
+    "payment-complete": "서비스 결제가 완료되었어요.",
+    "order-cancel": "서비스 주문이 취소되었어요.",
+}
+ORDER_STATUSES = set(STATUS_MESSAGES)
+
+
+class OrderTransitionError(Exception):
+    pass
+
+
+def lock_order(order_id):
+    """주문 row 잠금 후 반환 (트랜잭션 안에서 호출)"""
+    return Order.objects.select_for_update().get(id=order_id)
+
+
+def get_order_recipient(order):
+    """주문 안내 메일 수신자 (email, 이름)"""
+    if order.purchaser_user:
+        return (
+            order.purchaser_user.username,
+            order.purchaser_user.profile.name,
+        )
+    elif order.purchaser_customer:
+        return order.purchaser_customer.email, order.purchaser_customer.name
+    return None, None
+
+
+def send_order_email(
+    order,
+    content,
+    client_info=None,
+    email_template=ORDER_EMAIL_TEMPLATE,
+):
+    target, name = get_order_recipient(order)
+    if not target or not content:
+        return
+    send_auto_email(
+        client_info=client_info or order,
+        email_subject=ORDER_EMAIL_SUBJECT.format(name),
+        email_template=email_template,
+        to_email=target,
+        sub_title=content,
+    )
+
+
+def notify_order(
+    order, content, client_info=None, email_template=ORDER_EMAIL_TEMPLATE
+):
+    """이벤트 안내 메일 커밋 이후 발송 (상태 변경 여부와 무관)"""
+    transaction.on_commit(
+        lambda: send_order_email(
+            order,
+            content,
+            client_info=client_info,
+            email_template=email_template,
+        )
+    )
+
+
+class OrderTransition:
+    """
+    상태 변경 1건의 후속 처리 묶음
+    * 커밋 이후 dispatch 로 메일 발송
+    """
+
+    def __init__(
+        self,
+        order,
+        from_status,
+        to_status,
+        email_content=None,
+        client_info=None,
+        email_template=ORDER_EMAIL_TEMPLATE,
+    ):
+        self.order = order
+        self.from_status = from_status
+        self.to_status = to_status
+        self.email_content = email_content
+        self.client_info = client_info
+        self.email_template = email_template
+
+    def dispatch(self):
+        if self.email_content:
+            send_order_email(
+                self.order,
+                self.email_content,
+                client_info=self.client_info,
+                email_template=self.email_template,
+            )
+
+
+@transaction.atomic
+def transition_order(
+    order,
+    to_status,
+    user,
+    url,
+    default_log=None,
+    extra_content=None,
+    extra_url=None,
+    order_log_diff=None,
+    email=False,
+    email_content=None,
+    client_info=None,
+    email_template=ORDER_EMAIL_TEMPLATE,
+):
+    """
+    주문 상태 변경, 변경된 경우 OrderTransition 반환 / 같은 상태면 None
+    * email=True 이면 email_content (기본: 상태별 안내 문구) 로 메일 예약
+    * 같은 상태면 default_log 는 정상(200)으로 기록
+    """
+    if to_status not in ORDER_STATUSES:
+        raise OrderTransitionError(f"알 수 없는 주문 상태입니다. ({to_status})")
+
+    current_status = (
+        Order.objects.select_for_update()
+        .values_list("status", flat=True)
+        .get(id=order.id)
+    )
+    if current_status == to_status:
+        order.status = current_status
+        complete_system_log(
+            order,
+            ORDER_PAGE_NAME,
+            url,
+            user,
+            "update",
+            identifier=order.id,
+            extra_content=extra_content,
+            default_log=default_log,
+            extra_url=extra_url,
+        )
+        return None
+
+    before_order = copy.deepcopy(order)
+    before_order.status = current_status
+    order.status = to_status
+    order.save()
+
+    # 모든 상태 변경은 OrderLog 에 기록 (funnel 분석 기준)
+    order_log = {"diff": order_log_diff} if order_log_diff else {}
+    OrderLog.objects.create(
+        order=order,
+        to_status=to_status,
+        mtime=datetime.datetime.now(),
+        user=user,
+        **order_log,
+    )
+
+    if default_log is None:
+        default_log = SystemLog.objects.create(
+            page_name=ORDER_PAGE_NAME,
+            url=url,
+            user=user,
+            method="update",
+            status_code="500",
+        )
+    make_system_log(
+        before_order,
+        ORDER_PAGE_NAME,
+        url,
+        user,
+        "update",
+        identifier=order.id,
+        etc=[["status", to_status]],
+        default_log=default_log,
+        extra_content=extra_content,
+        extra_url=extra_url,
+    )
+
+    bundle = OrderTransition(
+        order,
+        current_status,
+        to_status,
+        email_content=(
+            (email_content or STATUS_MESSAGES[to_status]) if email else None
+        ),
+        client_info=client_info,
+        email_template=email_template,
+    )
+    transaction.on_commit(bundle.dispatch)
+    invalidate_sales_totals([order])
+    return bundle
+
+
+def send_order_emails(orders, content):
+    for order in orders:
+        send_order_email(order, content)
+
+
+def get_manager_names(users):
+    return [user.profile.name for user in users]
+
+
+@transaction.atomic
+def bulk_update_orders(
+    order_ids,
+    user,
+    status=None,
+    manager_ids=None,
+    is_active=None,
+):
+    """
+    여러 주문의 상태/담당자/공개 여부 일괄 변경
+    * 변경이 필요한 주문만 set 단위로 update, 주문 로그는 bulk_create
+    * 시스템 로그는 url 에 주문 상세 링크를 넣어 bulk_create
+    * 상태 안내 메일은 커밋 이후 한 번에 발송
+    * 반환값 : {주문 id: {"result": ..., "changes": [...]}}
+    """
+    if status is not None and status not in ORDER_STATUSES:
+        raise OrderTransitionError(f"알 수 없는 주문 상태입니다. ({status})")
+
+    orders = list(
+        Order.objects.select_for_update()
+        .filter(id__in=order_ids, is_deleted=False)
+        .order_by("id")
+    )
+    results = {
+        str(order_id): {"result": "not-found", "changes": []}
+        for order_id in order_ids
+    }
+    diffs = {order.id: {} for order in orders}
+    now = datetime.datetime.now()
+
+    # 상태
+    status_changed = []
+    if status is not None:
+        status_changed = [order for order in orders if order.status != status]
+        Order.objects.filter(
+            id__in=[order.id for order in status_changed]
+        ).update(status=status)
+        for order in status_changed:
+            diffs[order.id]["status"] = {
+                "before": order.status,
+                "value": status,
+            }
+            order.status = status
+
+    # 담당자
+    if manager_ids is not None:
+        field = Order._meta.get_field("manager")
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        managers = list(
+            User.objects.filter(id__in=manager_ids).select_related("profile")
+        )
+        manager_set = {manager.id for manager in managers}
+        before_managers = {order.id: [] for order in orders}
+        for row in through.objects.filter(
+            **{f"{source}_id__in": list(diffs)}
+        ).select_related(f"{target}__profile"):
+            before_managers[getattr(row, f"{source}_id")].append(
+                getattr(row, target)
+            )
+        manager_changed = [
+            order
+            for order in orders
+            if {m.id for m in before_managers[order.id]} != manager_set
+        ]
+        changed_ids = [order.id for order in manager_changed]
+        through.objects.filter(**{f"{source}_id__in": changed_ids}).delete()
+        through.objects.bulk_create(
+            [
+                through(**{f"{source}_id": order_id, f"{target}_id": m.id})
+                for order_id in changed_ids
+                for m in managers
+            ]
+        )
+        manager_diff = (
+            "담당자(" + "".join(m.username + "," for m in managers) + ")"
+        )
+        for order in manager_changed:
+            diffs[order.id]["manager"] = {
+                "before": get_manager_names(before_managers[order.id]),
+                "value": get_manager_names(managers),
+            }
+
+    # 공개 여부
+    if is_active is not None:
+        active_changed = [
+            order for order in orders if order.is_active != is_active
+        ]
+        Order.objects.filter(
+            id__in=[order.id for order in active_changed]
+        ).update(is_active=is_active)
+        for order in active_changed:
+            diffs[order.id]["is_active"] = {
+                "before": order.is_active,
+                "value": is_active,
+            }
+            order.is_active = is_active
+
+    order_logs = []
+    system_logs = []
+    for order in orders:
+        diff = diffs[order.id]
+        results[str(order.id)] = {
+            "result": "changed" if diff else "unchanged",
+            "changes": list(diff),
+        }
+        if not diff:
+            continue
+        if "status" in diff or "manager" in diff:
+            order_log = OrderLog(
+                order=order, to_status=order.status, mtime=now, user=user
+            )
+            if "manager" in diff:
+                order_log.diff = manager_diff
+            order_logs.append(order_log)
+        # save_with_url(extra_url) 와 같이 url 은 주문 상세 링크
+        system_logs.append(
+            SystemLog(
+                model="Order",
+                model_identifier=order.id,
+                page_name=ORDER_PAGE_NAME,
+                url=str(
+                    reverse_lazy(
+                        "myinco_admin-order-detail", kwargs={"id": order.id}
+                    )
+                ),
+                diff=diff,
+                method="update",
+                user=user,
+                extra_content=f"{ORDER_PAGE_NAME} 일괄 수정",
+                status_code="200",
+            )
+        )
+    OrderLog.objects.bulk_create(order_logs)
+    SystemLog.objects.bulk_create(system_logs)
+    invalidate_sales_totals(status_changed)
+    # queryset update / bulk_create 는 signal 이 없으므로 대시보드 집계 직접 삭제
+    rollup_orders = {order.id: order for order in status_changed}
+    if manager_ids is not None:
+        rollup_orders.update({order.id: order for order in manager_changed})
+    invalidate_rollup_days(
+        [order.ctime.date() for order in rollup_orders.values()]
+        + ([now.date()] if order_logs else [])
+    )
+
+    if status_changed and STATUS_MESSAGES[status]:
+        email_orders = list(
+            Order.objects.filter(
+                id__in=[order.id for order in status_changed]
+            ).select_related("purchaser_user__profile", "purchaser_customer")
+        )
+        transaction.on_commit(
+            lambda: send_order_emails(email_orders, STATUS_MESSAGES[status])
+        )
+    return results
@@ -2,18 +2,24 @@ from django import forms
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 
 from django.http import JsonResponse, HttpResponseRedirect
-from django.db.models import Case, When, Q
+from django.db.models import Q
 from django.urls import reverse_lazy
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
-from isghome.views.myinco.util import make_system_log
+from isghome.views.myinco.util import (
+    make_system_log,
+    attach_total_sales,
+)
+from isghome.views.myinco.bookmark import (
+    annotate_bookmarked,
+    toggle_bookmark,
+)
 
 from isghome.models import (
     User,
     UserProfile,
     Customer,
     Organization,
-    OrganizationBookmark,
     OrganizationLog,
     SalesActivity,
     SystemLog,
@@ -78,23 +84,10 @@ class MyincoOrganizationListView(ListView, CreateView):
         #         default=False,
         #     )
         # ).distinct()
-        queryset = queryset.annotate(
-            is_bookmarked=Case(
-                When(
-                    organizationbookmark__user__id=user_id,
-                    then=True,
-                ),
-                default=False,
-            )
+        queryset = annotate_bookmarked(
+            queryset.distinct(), "organization", user_id
         )
 
-        true_set = queryset.filter(is_bookmarked=True).distinct()
-        ids = true_set.values_list("id", flat=True)
-        false_set = (
-            queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
-        )
-        queryset = true_set | false_set
-
         # .filter(Q(is_bookmarked_user=user_id) | Q(is_bookmarked_user=None))
         # .annotate(
         #     is_bookmarked=Case(
@@ -122,7 +115,7 @@ class MyincoOrganizationListView(ListView, CreateView):
         context_data = super().get_context_data(**kwargs)
         context_data["total_object_list"] = context_data["object_list"]
         p = Paginator(context_data["object_list"], 10)
-        context_data["object_list"] = p.page(1)
+        context_data["object_list"] = attach_total_sales(p.page(1))
         context_data["bookmark_count"] = self.object_list.filter(
             is_bookmarked=True
         ).count()
@@ -195,22 +188,9 @@ def organization_page_ajax(request):
 
     queryset = queryset.filter(is_deleted=False)
 
-    queryset = queryset.annotate(
-        is_bookmarked=Case(
-            When(
-                organizationbookmark__user__id=user_id,
-                then=True,
-            ),
-            default=False,
-        )
-    )
-
-    true_set = queryset.filter(is_bookmarked=True).distinct()
-    ids = true_set.values_list("id", flat=True)
-    false_set = (
-        queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
+    queryset = annotate_bookmarked(
+        queryset.distinct(), "organization", user_id
     )
-    queryset = true_set | false_set
 
     ordering = ("-ctime",)
     if ordering:
@@ -220,7 +200,7 @@ def organization_page_ajax(request):
 
     try:
         p = Paginator(queryset, 10)
-        queryset = p.page(int(page))
+        queryset = attach_total_sales(p.page(int(page)))
 
         context = {"object_list": queryset, "page": int(page)}
         
@@ -246,49 +226,41 @@ def organization_bookmark_ajax(request):
     organization_id = request.POST.get("organization")
     status = True if request.POST.get("status") == "true" else False
 
-    bookmarks = OrganizationBookmark.objects.filter(
-        organization=Organization.objects.get(id=organization_id),
-        user=User.objects.get(id=user),
+    organization_id = Organization.objects.values_list("id", flat=True).get(
+        id=organization_id
     )
 
     if status:
-        if bookmarks:
+        if not toggle_bookmark(
+            "organization", user, organization_id, add=True
+        ):
             return JsonResponse({"data": "bookmark already added"}, status=200)
-        else:
-            OrganizationBookmark.objects.create(
-                organization=Organization.objects.get(id=organization_id),
-                user=User.objects.get(id=user),
+        try:
+            OrganizationLog.objects.create(
+                organization_id=organization_id,
+                diff="add bookmark",
             )
-            try:
-                OrganizationLog.objects.create(
-                    organization=Organization.objects.get(id=organization_id),
-                    diff="add bookmark",
-                )
-            except Exception as e:
-                print(e)
+        except Exception as e:
+            print(e)
 
-            return JsonResponse({"data": "bookmark added"}, status=200)
+        return JsonResponse({"data": "bookmark added"}, status=200)
 
     else:
-        if not bookmarks:
+        if not toggle_bookmark(
+            "organization", user, organization_id, add=False
+        ):
             return JsonResponse(
                 {"data": "bookmark already removed"}, status=200
             )
-        else:
-            OrganizationBookmark.objects.get(
-                organization=Organization.objects.get(id=organization_id),
-                user=User.objects.get(id=user),
-            ).delete()
-
-            try:
-                OrganizationLog.objects.create(
-                    organization=Organization.objects.get(id=organization_id),
-                    diff="remove bookmark",
-                )
-            except Exception as e:
-                print(e)
+        try:
+            OrganizationLog.objects.create(
+                organization_id=organization_id,
+                diff="remove bookmark",
+            )
+        except Exception as e:
+            print(e)
 
-            return JsonResponse({"data": "bookmark removed"}, status=200)
+        return JsonResponse({"data": "bookmark removed"}, status=200)
 
 
 class MyincoOrganizationDetailView(DetailView, UpdateView):
@@ -82,16 +82,13 @@ class BaseSalesActivityListView(ListView):
         context = super().get_context_data(*args, **kwargs)
         calender_data = self.get_calender_data()
         context["calender_data"] = json.dumps(calender_data)
-        context["organizations"] = Organization.objects.filter(
-            is_active=True
-        ).order_by("place_name")
+        # 고객사/그룹 검색은 search_picker_ajax 로 조회
         managers = User.objects.filter(profile__auth_grade__gt=1)
         managers = managers.filter(
             profile__auth_grade__lte=self.request.user.profile.auth_grade
         )
         context["managers"] = managers
         context["query_type"] = self.query_type
-        context["auth_groups"] = AuthGroup.objects.all()
         keyword = self.request.GET.get("keyword")
         manager = self.request.GET.get("manager")
         context["form_kwargs"] = {"keyword": keyword, "manager": manager}
@@ -0,0 +1,118 @@
+from django.db.models import Q
+from django.http import JsonResponse
+
+from isghome.models import User, AuthGroup, Customer, Organization
+
+
+"""
+검색 선택 상자(typeahead)
+* 화면에 전체 목록을 넣지 않고 입력한 앞글자(prefix)로 상위 N 건만 조회
+* kind : user / group / account (계정 + 그룹) / customer / organization
+* 반환 항목 : {"id", "value", "sub", "is_account"}
+"""
+
+PICKER_LIMIT = 20
+PICKER_MAX_LIMIT = 100
+
+
+def search_users(keyword, limit):
+    queryset = User.objects.all()
+    if keyword:
+        queryset = queryset.filter(
+            Q(profile__name__istartswith=keyword)
+            | Q(username__istartswith=keyword)
+        )
+    return [
+        {
+            "id": pk,
+            "value": name or username,
+            "sub": username,
+            "is_account": True,
+        }
+        for pk, name, username in queryset.order_by(
+            "profile__name", "id"
+        ).values_list("id", "profile__name", "username")[:limit]
+    ]
+
+
+def search_groups(keyword, limit):
+    queryset = AuthGroup.objects.all()
+    if keyword:
+        queryset = queryset.filter(name__istartswith=keyword)
+    return [
+        {"id": pk, "value": name, "sub": "", "is_account": False}
+        for pk, name in queryset.order_by("name", "id").values_list(
+            "id", "name"
+        )[:limit]
+    ]
+
+
+def search_accounts(keyword, limit):
+    """계정 + 그룹 (그룹 멤버 추가 화면)"""
+    users = search_users(keyword, limit)
+    return users + search_groups(keyword, limit - len(users))
+
+
+def search_customers(keyword, limit):
+    queryset = Customer.objects.filter(is_deleted=False)
+    if keyword:
+        queryset = queryset.filter(
+            Q(name__istartswith=keyword)
+            | Q(email__istartswith=keyword)
+            | Q(phone_number__startswith=keyword)
+        )
+    return [
+        {
+            "id": pk,
+            "value": name,
+            "sub": organization or email or "",
+            "is_account": False,
+        }
+        for pk, name, email, organization in queryset.order_by(
+            "name", "id"
+        ).values_list("id", "name", "email", "organization__place_name")[
+            :limit
+        ]
+    ]
+
+
+def search_organizations(keyword, limit):
+    queryset = Organization.objects.filter(is_active=True)
+    if keyword:
+        queryset = queryset.filter(place_name__istartswith=keyword)
+    return [
+        {"id": pk, "value": place_name, "sub": "", "is_account": False}
+        for pk, place_name in queryset.order_by(
+            "place_name", "id"
+        ).values_list("id", "place_name")[:limit]
+    ]
+
+
+PICKER_SEARCHES = {
+    "user": search_users,
+    "group": search_groups,
+    "account": search_accounts,
+    "customer": search_customers,
+    "organization": search_organizations,
+}
+
+
+def search_picker_ajax(request):
+    """
+    검색 선택 상자 조회
+    * kind : PICKER_SEARCHES 키
+    * keyword : 앞글자 (없으면 정렬 순 상위 N 건)
+    * limit : 최대 PICKER_MAX_LIMIT
+    """
+    search = PICKER_SEARCHES.get(request.GET.get("kind"))
+    try:
+        limit = min(
+            int(request.GET.get("limit", PICKER_LIMIT)), PICKER_MAX_LIMIT
+        )
+    except ValueError:
+        search = None
+    if search is None or limit <= 0:
+        return JsonResponse({"data": "잘못된 조회 조건입니다."}, status=400)
+
+    keyword = (request.GET.get("keyword") or "").strip()
+    return JsonResponse({"data": search(keyword, limit), "status": True})
@@ -7,7 +7,10 @@ from django.views.generic import (
 from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.core.cache import cache
 # from django.forms.models import inlineformset_factory
 from django.utils.safestring import mark_safe
 
@@ -21,6 +24,60 @@ from isghome.models import (
 from isghome.views import MultipleCharField
 
 
+TAG_INDEX_KEY = 'myinco:product:tag-index'
+CATEGORY_TREE_KEY = 'myinco:product:category-tree'
+
+
+def get_tag_index():
+    """
+    태그 인덱스 {태그: [product id, ...]} (등록 순서 유지)
+    """
+    tag_index = cache.get(TAG_INDEX_KEY)
+    if tag_index is None:
+        tag_index = {}
+        products = Product.objects.exclude(
+                related_tags='').exclude(
+                        related_tags=None).order_by('id').values_list(
+                                'id', 'related_tags')
+        for product_id, tags in products:
+            for t in tags.split(','):
+                tag_index.setdefault(t, []).append(product_id)
+        cache.set(TAG_INDEX_KEY, tag_index, None)
+    return tag_index
+
+
+def get_tag_list():
+    return list(get_tag_index())
+
+
+def get_category_tree():
+    """
+    대/소 카테고리 목록 {'main': [...], 'sub': [...]}
+    """
+    category_tree = cache.get(CATEGORY_TREE_KEY)
+    if category_tree is None:
+        categories = list(ProductCategory.objects.filter(
+                category_type__in=['main', 'sub']))
+        category_tree = {
+            'main': [c for c in categories if c.category_type == 'main'],
+            'sub': [c for c in categories if c.category_type == 'sub'],
+        }
+        cache.set(CATEGORY_TREE_KEY, category_tree, None)
+    return category_tree
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_tag_index(sender, instance, **kwargs):
+    cache.delete(TAG_INDEX_KEY)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_category_tree(sender, instance, **kwargs):
+    cache.delete(CATEGORY_TREE_KEY)
+
+
 class MyincoProductListView(ListView):
     model = Product
     # ordering = ('display_order', '-mtime')
@@ -29,8 +86,11 @@ class MyincoProductListView(ListView):
 
     def get_queryset(self):
         keyword = self.request.GET.get('keyword')
+        tag = self.request.GET.get('tag')
         queryset = super().get_queryset()
         queryset = queryset.filter(productdescription__isnull=False)
+        if tag:
+            queryset = queryset.filter(id__in=get_tag_index().get(tag, []))
         if keyword:
             queryset = queryset.filter(
                 Q(product_name__icontains=keyword) |
@@ -41,18 +101,8 @@ class MyincoProductListView(ListView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        context_data['main_categories'] = ProductCategory.objects.filter(
-                category_type='main')
-        related_tags = Product.objects.exclude(
-                related_tags='').values_list(
-                        'related_tags', flat=True)
-        tag_list = []
-        for tags in related_tags:
-            if tags:
-                for t in tags.split(','):
-                    if t not in tag_list:
-                        tag_list.append(t)
-        context_data['tag_list'] = tag_list
+        context_data['main_categories'] = get_category_tree()['main']
+        context_data['tag_list'] = get_tag_list()
         return context_data
 
 
@@ -132,18 +182,8 @@ class MyincoProductCreateView(CreateView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        context_data['main_categories'] = ProductCategory.objects.filter(
-                category_type='main')
-        related_tags = Product.objects.exclude(
-                related_tags='').values_list(
-                        'related_tags', flat=True)
-        tag_list = []
-        for tags in related_tags:
-            if tags:
-                for t in tags.split(','):
-                    if t not in tag_list:
-                        tag_list.append(t)
-        context_data['tag_list'] = tag_list
+        context_data['main_categories'] = get_category_tree()['main']
+        context_data['tag_list'] = get_tag_list()
         return context_data
 
     def get_success_url(self):
@@ -290,37 +330,31 @@ class MyincoProductUpdateView(UpdateView):
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        context['main_categories'] = ProductCategory.objects.filter(
-                category_type='main')
-        all_tags = Product.objects.exclude(
-                related_tags='').values_list(
-                        'related_tags', flat=True)
-        tag_list = []
-        for tags in all_tags:
-            if tags:
-                for t in tags.split(','):
-                    if t not in tag_list:
-                        tag_list.append(t)
-        context['tag_list'] = tag_list
+        context['main_categories'] = get_category_tree()['main']
+        context['tag_list'] = get_tag_list()
         related_tags = []
         if self.object.related_tags:
             related_tags = self.object.related_tags.split(',')
         context['related_tags'] = related_tags
-        spos = ServicePolicyPriceOption.objects.filter(
-                product=self.object).values_list('policy')
-        sp_ids = [values[0] for values in spos]
-        policy_set = ServicePolicy.objects.filter(
-                id__in=sp_ids).order_by('-ctime')
+        # 상품 연결 정책 + 같은 카테고리의 빈 정책을 한 번에 조회
+        price_options = ServicePolicyPriceOption.objects.filter(
+                policy=OuterRef('pk'))
+        policies = ServicePolicy.objects.annotate(
+                has_product=Exists(price_options.filter(product=self.object)),
+                has_option=Exists(price_options),
+        ).filter(
+                Q(has_product=True) |
+                Q(category=self.object.category, has_option=False),
+        ).order_by('-ctime')
+        policy_set = []
         empty_policy_set = []
-        empty_policy_set = ServicePolicy.objects.filter(
-                category=self.object.category).exclude(id__in=sp_ids)
-        empty_policy_ids = []
-        for policy in empty_policy_set:
-            if policy.servicepolicypriceoption_set.count() == 0:
-                empty_policy_ids.append(policy.id)
+        for policy in policies:
+            if policy.has_product:
+                policy_set.append(policy)
+            else:
+                empty_policy_set.append(policy)
         context['policy_set'] = policy_set
-        context['empty_policy_set'] = ServicePolicy.objects.filter(
-                id__in=empty_policy_ids)
+        context['empty_policy_set'] = empty_policy_set
         return context
 
     def get_initial(self):
@@ -0,0 +1,323 @@
+import datetime
+
+import pandas as pd
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.http import JsonResponse
+from django.urls import reverse_lazy
+
+from isghome.models import UserProfile, Customer, SystemLog
+from isghome.views.myinco.util import invalidate_related_sales_totals
+
+
+"""
+고객 <-> 계정 연동 후보 일괄 계산
+* 연동되지 않은 고객/계정 전체를 정규화 전화번호, 이메일로 blocking
+* 이름 일치(성 일치)는 점수에 반영
+* 후보 쌍은 pandas 로 한 번에 점수 계산 후 후보 테이블(캐시)에 저장
+* 검토 화면은 후보 테이블을 페이지 단위로 조회, 선택한 후보는 일괄 연동
+* 야간 작업 등에서 build_sync_candidates 호출
+"""
+
+SYNC_CANDIDATE_KEY = "myinco:sync-candidates"
+SYNC_PAGE_NAME = "고객"
+# 이름만 같은 쌍은 MIN_SCORE 미만이라 연락처로만 blocking
+BLOCK_KEYS = ["phone", "email"]
+SCORE_WEIGHTS = {"name": 0.4, "phone": 0.3, "email": 0.3}
+# 성만 같은 경우 (이름 오타 등)
+SURNAME_SCORE = 0.1
+MIN_SCORE = 0.6
+CANDIDATE_COLUMNS = [
+    "customer_id",
+    "profile_id",
+    "user_id",
+    "score",
+    "name_match",
+    "phone_match",
+    "email_match",
+    "customer_name",
+    "customer_email",
+    "customer_phone",
+    "user_name",
+    "user_email",
+    "user_phone",
+]
+
+
+def normalize_frame(df):
+    """name, phone, email 컬럼 정규화 (matching.py 와 같은 규칙)"""
+    df["name"] = (
+        df["name"].fillna("").str.replace(r"\s+", "", regex=True).str.lower()
+    )
+    phone = df["phone"].fillna("").str.replace(r"\D", "", regex=True)
+    international = phone.str.startswith("82") & (phone.str.len() > 10)
+    df["phone"] = phone.where(~international, "0" + phone.str[2:])
+    df["email"] = df["email"].fillna("").str.strip().str.lower()
+    return df
+
+
+def load_sync_frames():
+    """연동되지 않은 (고객, 계정) DataFrame"""
+    customers = pd.DataFrame(
+        list(
+            Customer.objects.filter(
+                is_deleted=False, is_synced=False
+            ).values_list("id", "name", "phone_number", "email")
+        ),
+        columns=[
+            "customer_id",
+            "customer_name",
+            "customer_phone",
+            "customer_email",
+        ],
+    )
+    users = pd.DataFrame(
+        list(
+            UserProfile.objects.filter(
+                is_deleted=False, is_synced=False
+            ).values_list(
+                "id", "user_id", "name", "phone_number", "user__email"
+            )
+        ),
+        columns=[
+            "profile_id",
+            "user_id",
+            "user_name",
+            "user_phone",
+            "user_email",
+        ],
+    )
+    for df, prefix in ((customers, "customer"), (users, "user")):
+        for column in ("name", "phone", "email"):
+            df[column] = df[f"{prefix}_{column}"]
+        normalize_frame(df)
+    return customers, users
+
+
+def block_pairs(customers, users):
+    """blocking 키 중 하나라도 같은 (customer_id, profile_id) 쌍"""
+    pairs = []
+    for key in BLOCK_KEYS:
+        left = customers[customers[key] != ""]
+        right = users[users[key] != ""]
+        pairs.append(
+            left[["customer_id", key]].merge(
+                right[["profile_id", key]], on=key
+            )[["customer_id", "profile_id"]]
+        )
+    return pd.concat(pairs, ignore_index=True).drop_duplicates()
+
+
+def score_pairs(pairs, customers, users):
+    """후보 쌍 점수 계산 (MIN_SCORE 이상, 점수 내림차순)"""
+    df = pairs.merge(customers, on="customer_id").merge(
+        users, on="profile_id", suffixes=("_c", "_u")
+    )
+    for key in SCORE_WEIGHTS:
+        df[f"{key}_match"] = (df[f"{key}_c"] != "") & (
+            df[f"{key}_c"] == df[f"{key}_u"]
+        )
+    surname_match = (
+        ~df["name_match"]
+        & (df["name_c"] != "")
+        & (df["name_c"].str[0] == df["name_u"].str[0])
+    )
+    df["score"] = sum(
+        df[f"{key}_match"] * weight for key, weight in SCORE_WEIGHTS.items()
+    ) + surname_match * SURNAME_SCORE
+    df["score"] = df["score"].round(2)
+    df = df[df["score"] >= MIN_SCORE]
+    return df.sort_values(
+        ["score", "customer_id", "profile_id"],
+        ascending=[False, True, True],
+        kind="stable",
+    )[CANDIDATE_COLUMNS]
+
+
+def build_sync_candidates():
+    """후보 테이블 재생성, 후보 수 반환"""
+    customers, users = load_sync_frames()
+    if customers.empty or users.empty:
+        candidates = pd.DataFrame(columns=CANDIDATE_COLUMNS)
+    else:
+        candidates = score_pairs(
+            block_pairs(customers, users), customers, users
+        )
+    rows = [
+        {
+            key: (value.item() if hasattr(value, "item") else value)
+            for key, value in row.items()
+        }
+        for row in candidates.to_dict("records")
+    ]
+    cache.set(
+        SYNC_CANDIDATE_KEY,
+        {"ctime": datetime.datetime.now().isoformat(), "rows": rows},
+        None,
+    )
+    return len(rows)
+
+
+def get_sync_candidates():
+    return cache.get(SYNC_CANDIDATE_KEY) or {"ctime": None, "rows": []}
+
+
+def remove_sync_candidates(customer_ids, user_ids):
+    """연동된 고객/계정이 포함된 후보 제거"""
+    state = get_sync_candidates()
+    state["rows"] = [
+        row
+        for row in state["rows"]
+        if row["customer_id"] not in customer_ids
+        and row["user_id"] not in user_ids
+    ]
+    cache.set(SYNC_CANDIDATE_KEY, state, None)
+
+
+@transaction.atomic
+def accept_sync_candidates(pairs, user):
+    """
+    (customer_id, profile_id) 쌍 일괄 연동
+    * 이미 연동된 고객/계정, 중복 선택된 고객/계정은 건너뜀
+    * 반환값 : 연동된 고객 id 목록
+    """
+    customers = {
+        customer.id: customer
+        for customer in Customer.objects.select_for_update().filter(
+            id__in=[customer_id for customer_id, profile_id in pairs],
+            is_deleted=False,
+            is_synced=False,
+        )
+    }
+    profiles = {
+        profile.id: profile
+        for profile in UserProfile.objects.select_for_update()
+        .select_related("user")
+        .filter(
+            id__in=[profile_id for customer_id, profile_id in pairs],
+            is_deleted=False,
+            is_synced=False,
+        )
+    }
+    links = {}
+    used_profiles = set()
+    for customer_id, profile_id in pairs:
+        if (
+            customer_id in customers
+            and profile_id in profiles
+            and customer_id not in links
+            and profile_id not in used_profiles
+        ):
+            links[customer_id] = profiles[profile_id]
+            used_profiles.add(profile_id)
+    if not links:
+        return []
+
+    user_ids = [profile.user_id for profile in links.values()]
+    # 계정에 남아있는 이전 고객 연동 해제 (개별 연동과 동일)
+    unlinked = Customer.objects.filter(synced_user_id__in=user_ids).exclude(
+        id__in=list(links)
+    )
+    unlinked_ids = list(unlinked.values_list("id", flat=True))
+    unlinked.update(synced_user=None, is_synced=False)
+    Customer.objects.filter(id__in=list(links)).update(
+        synced_user=Case(
+            *[
+                When(id=customer_id, then=Value(profile.user_id))
+                for customer_id, profile in links.items()
+            ],
+            output_field=Customer._meta.get_field("synced_user"),
+        ),
+        is_synced=True,
+    )
+    UserProfile.objects.filter(id__in=list(used_profiles)).update(
+        is_synced=True
+    )
+    invalidate_related_sales_totals(
+        customer_ids=list(links) + unlinked_ids, user_ids=user_ids
+    )
+
+    # save_with_url(extra_url) 와 같이 url 은 고객 상세 링크
+    SystemLog.objects.bulk_create(
+        [
+            SystemLog(
+                model="Customer",
+                model_identifier=customer_id,
+                page_name=SYNC_PAGE_NAME,
+                url=str(
+                    reverse_lazy(
+                        "myinco_admin-customer-detail",
+                        kwargs={"id": customer_id, "tab": 0},
+                    )
+                ),
+                diff={"is_synced": {"before": False, "value": True}},
+                method="update",
+                user=user,
+                extra_content=f"{user.profile.name}님에 의해 {customers[customer_id].name}({customers[customer_id].email}) 고객, 일괄 추천 데이터({profile.name}, {profile.user.username})연동",  # noqa
+                status_code="200",
+            )
+            for customer_id, profile in links.items()
+        ]
+    )
+    accepted = list(links)
+    transaction.on_commit(
+        lambda: remove_sync_candidates(set(accepted), set(user_ids))
+    )
+    return accepted
+
+
+def sync_candidate_ajax(request):
+    """
+    연동 후보 검토 목록
+    * start, limit : 페이지 (기본 0, 50)
+    * min_score : 최소 점수
+    """
+    try:
+        start = int(request.GET.get("start", 0))
+        limit = min(int(request.GET.get("limit", 50)), 500)
+        min_score = float(request.GET.get("min_score", MIN_SCORE))
+    except ValueError:
+        return JsonResponse({"data": "잘못된 조회 조건입니다."}, status=400)
+
+    state = get_sync_candidates()
+    rows = [row for row in state["rows"] if row["score"] >= min_score]
+    return JsonResponse(
+        {
+            "data": rows[start:start + limit],
+            "ctime": state["ctime"],
+            "total": len(rows),
+            "next_start": (
+                start + limit if start + limit < len(rows) else None
+            ),
+            "status": True,
+        }
+    )
+
+
+def sync_candidate_accept_ajax(request):
+    """
+    연동 후보 일괄 연동
+    * candidates : "고객 id:계정(UserProfile) id" 목록
+    """
+    try:
+        pairs = [
+            tuple(int(value) for value in candidate.split(":"))
+            for candidate in request.POST.getlist("candidates")
+        ]
+    except ValueError:
+        return JsonResponse({"data": "잘못된 요청입니다."}, status=400)
+    if not pairs or any(len(pair) != 2 for pair in pairs):
+        return JsonResponse({"data": "선택된 후보가 없습니다."}, status=400)
+
+    accepted = accept_sync_candidates(pairs, request.user)
+    return JsonResponse(
+        {
+            "data": {
+                "accepted": accepted,
+                "skipped": len(pairs) - len(accepted),
+            },
+            "status": True,
+        }
+    )
@@ -0,0 +1,112 @@
+import threading
+import time
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+
+from isghome.models import ServicePolicyPriceOption
+from isghome.views.myinco import order_identifier
+from isghome.views.myinco.order import create_order_carts
+
+
+LOCMEM_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "myinco-order-identifier-test",
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class OrderIdentifierLockTest(TransactionTestCase):
+    """
+    주문번호 잠금
+    * 기존 주문 조회(generate_order_identifier)를 느린 목록 조회로 대체
+    * 동시에 발급한 번호는 요청 수만큼 모두 달라야 함
+    * 잠금 블록 안에서 예외로 롤백돼도 다음 발급은 바로 가능해야 함
+    """
+
+    THREADS = 8
+    ROUNDS = 5
+
+    def setUp(self):
+        self.issued = []
+        self.issued_lock = threading.Lock()
+        generate = mock.patch.object(
+            order_identifier,
+            "generate_order_identifier",
+            side_effect=self.fake_generate,
+        )
+        generate.start()
+        self.addCleanup(generate.stop)
+
+    def fake_generate(self, service_type, order_type):
+        with self.issued_lock:
+            count = len(self.issued)
+        # 조회 ~ 저장 사이 경합이 드러나도록 지연
+        time.sleep(0.005)
+        return f"{service_type}-{order_type}-{count + 1:05d}"
+
+    def allocate(self):
+        with order_identifier.order_identifier_lock("solution", "online"):
+            identifier = order_identifier.allocate_order_identifier(
+                "solution", "online"
+            )
+            with self.issued_lock:
+                self.issued.append(identifier)
+        return identifier
+
+    def create(self):
+        try:
+            for _ in range(self.ROUNDS):
+                self.allocate()
+        finally:
+            connection.close()
+
+    def test_concurrent_allocation_is_unique(self):
+        threads = [
+            threading.Thread(target=self.create) for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.issued), self.THREADS * self.ROUNDS)
+        self.assertEqual(len(set(self.issued)), len(self.issued))
+
+    def test_lock_released_when_cart_creation_fails(self):
+        # 번호 발급 이후 주문 서비스 생성 실패 (없는 가격 옵션)
+        with self.assertRaises(ServicePolicyPriceOption.DoesNotExist):
+            with order_identifier.order_identifier_lock("solution", "online"):
+                order_identifier.allocate_order_identifier(
+                    "solution", "online"
+                )
+                create_order_carts(None, [{"id": 0, "count": 1}])
+
+        with mock.patch.object(order_identifier, "IDENTIFIER_LOCK_WAIT", 0):
+            self.assertTrue(self.allocate())
+
+    def test_lock_released_before_on_commit_work(self):
+        locked = []
+        key = order_identifier.IDENTIFIER_LOCK_KEY.format("solution:online")
+        with order_identifier.order_identifier_lock("solution", "online"):
+            transaction.on_commit(
+                lambda: locked.append(
+                    order_identifier.cache.get(key) is not None
+                )
+            )
+        self.assertEqual(locked, [False])
+
+    def test_lock_rejects_outer_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(transaction.TransactionManagementError):
+                with order_identifier.order_identifier_lock("solution", "0"):
+                    pass
+
+    def test_increment_identifier_keeps_width(self):
+        self.assertEqual(
+            order_identifier.increment_identifier("S-20240101-0099", 2),
+            "S-20240101-0101",
+        )
@@ -2,19 +2,28 @@ from django import forms
 from django.views.generic import ListView, DetailView, CreateView
 from django.http import JsonResponse
 from django.core.paginator import Paginator
-from django.db.models import Case, When, Q
+from django.db.models import Q
 from django.template.loader import render_to_string
 from django.http import HttpResponseRedirect
 from django.urls import reverse_lazy
 from isghome.views import send_auto_email
 
-from isghome.views.myinco.util import make_system_log
+from isghome.views.myinco.util import (
+    make_system_log,
+    attach_total_sales,
+    invalidate_related_sales_totals,
+)
+from isghome.views.myinco.catalog import get_catalog
+from isghome.views.myinco.bookmark import (
+    annotate_bookmarked,
+    toggle_bookmark,
+)
+from isghome.views.myinco.matching import get_customer_candidates
 from isghome.models import (
     ServicePolicyPriceOption,
     User,
     UserProfile,
     Customer,
-    UserBookmark,
     UserLog,
     Order,
     Organization,
@@ -225,21 +234,9 @@ class MyincoAdminUserListView(ListView, CreateView):
         #     )
         # ).distinct()
 
-        queryset = queryset.annotate(
-            is_bookmarked=Case(
-                When(
-                    user__bookmark_target_user__user__id=user_id,
-                    then=True,
-                ),
-                default=False,
-            )
+        queryset = annotate_bookmarked(
+            queryset.distinct(), "user", user_id, field="user_id"
         )
-        true_set = queryset.filter(is_bookmarked=True).distinct()
-        ids = true_set.values_list("id", flat=True)
-        false_set = (
-            queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
-        )
-        queryset = true_set | false_set
 
         if ordering:
             if isinstance(ordering, str):
@@ -256,12 +253,10 @@ class MyincoAdminUserListView(ListView, CreateView):
         context_data["total_objects_count"] = objects.count()
         p = Paginator(objects, 10)
 
-        customers = Customer.objects.filter(is_deleted=False)
-
-        context_data["customers"] = customers
+        # 고객 검색은 search_picker_ajax (kind=customer) 로 조회
         context_data["total_object_list"] = context_data["object_list"]
 
-        context_data["object_list"] = p.page(1)
+        context_data["object_list"] = attach_total_sales(p.page(1))
         context_data["page"] = 1
         return context_data
 
@@ -461,22 +456,9 @@ def user_page_ajax(request):
 
     queryset = queryset.filter(is_deleted=False)
 
-    queryset = queryset.annotate(
-        is_bookmarked=Case(
-            When(
-                user__userbookmark__user__id=user_id,
-                then=True,
-            ),
-            default=False,
-        )
-    )
-
-    true_set = queryset.filter(is_bookmarked=True).distinct()
-    ids = true_set.values_list("id", flat=True)
-    false_set = (
-        queryset.filter(is_bookmarked=False).distinct().exclude(id__in=ids)
+    queryset = annotate_bookmarked(
+        queryset.distinct(), "user", user_id, field="user_id"
     )
-    queryset = true_set | false_set
 
     ordering = ("-ctime",)
     if ordering:
@@ -486,7 +468,7 @@ def user_page_ajax(request):
 
     try:
         p = Paginator(queryset, 10)
-        queryset = p.page(int(page))
+        queryset = attach_total_sales(p.page(int(page)))
 
         context = {"object_list": queryset, "page": int(page)}
 
@@ -512,47 +494,39 @@ def user_bookmark_ajax(request):
     user_profile_id = request.POST.get("target_user")
     status = True if request.POST.get("status") == "true" else False
 
-    target_user = UserProfile.objects.get(id=user_profile_id).user
+    target_user_id = UserProfile.objects.values_list("user_id", flat=True).get(
+        id=user_profile_id
+    )
 
-    bookmarks = UserBookmark.objects.filter(target_user=target_user)
+    # 요청한 사용자(user) 기준으로만 추가/삭제
     if status:
-        if bookmarks:
+        if not toggle_bookmark("user", user, target_user_id, add=True):
             return JsonResponse({"data": "bookmark already added"}, status=200)
-        else:
-            UserBookmark.objects.create(
-                target_user=target_user,
-                user=User.objects.get(id=user),
+        try:
+            UserLog.objects.create(
+                diff="add bookmark",
+                target_user_id=target_user_id,
+                user_id=user,
             )
-            try:
-                UserLog.objects.create(
-                    diff="add bookmark",
-                    target_user=target_user,
-                    user=User.objects.get(id=user),
-                )
-            except Exception as e:
-                print(e)
+        except Exception as e:
+            print(e)
 
-            return JsonResponse({"data": "bookmark added"}, status=200)
+        return JsonResponse({"data": "bookmark added"}, status=200)
 
     else:
-        if not bookmarks:
+        if not toggle_bookmark("user", user, target_user_id, add=False):
             return JsonResponse(
                 {"data": "bookmark already removed"}, status=200
             )
-        else:
-            UserBookmark.objects.get(
-                target_user=target_user,
-            ).delete()
-
-            try:
-                UserLog.objects.create(
-                    target_user=target_user,
-                    diff="remove bookmark",
-                )
-            except Exception as e:
-                print(e)
+        try:
+            UserLog.objects.create(
+                target_user_id=target_user_id,
+                diff="remove bookmark",
+            )
+        except Exception as e:
+            print(e)
 
-            return JsonResponse({"data": "bookmark removed"}, status=200)
+        return JsonResponse({"data": "bookmark removed"}, status=200)
 
 
 class MyincoAdminUserDetailView(DetailView):
@@ -580,23 +554,9 @@ class MyincoAdminUserDetailView(DetailView):
         #     purchaser_user=user.synced_user
         # )
 
-        recommend_customers = Customer.objects.filter(
-            Q(name=user_profile.name)
-            & Q(is_deleted=False)
-            & (
-                Q(phone_number=user_profile.phone_number)
-                | Q(email=user_profile.user.email)
-            )
-        ).order_by("-ctime")
-
-        # recommend_customers = []
-        # for each in customers:
-        #     if each.name == user_profile.name:
-        #         if each.phone_number == user_profile.phone_number:
-        #             recommend_customers.append(each)
-        #         elif each.email == user_profile.user.email:
-        #             recommend_customers.append(each)
-        data["recommends"] = recommend_customers
+        data["recommends"] = get_customer_candidates(
+            user_profile, fuzzy=self.request.GET.get("fuzzy") == "true"
+        )
 
         # customers = Customer.objects.filter(~Q(name=None))
         customers = Customer.objects.filter(is_deleted=False).order_by(
@@ -608,17 +568,7 @@ class MyincoAdminUserDetailView(DetailView):
         data["page"] = 1
 
         # 서비스
-        policys = ServicePolicyPriceOption.objects.filter(
-            policy__is_active=True
-        )
-        # policy_dict = {}
-        # for policy in policys:
-        #     if policy.product_name in policy_dict.keys():
-        #         policy_dict[policy.product_name].append(policy)
-        #     else:
-        #         policy_dict[policy.product_name] = [policy]
-        # data["policys"] = policy_dict
-        data["policys"] = policys
+        data["policys"] = get_catalog().active_options
 
         data["my_cart"] = user_profile.user.mycart_set.filter(is_ordered=False)
 
@@ -750,6 +700,9 @@ class MyincoAdminUserDetailView(DetailView):
                 user_profile.is_synced = False
                 customer.save()
                 user_profile.save()
+                invalidate_related_sales_totals(
+                    customer_ids=[customer.id], user_ids=[user_profile.user_id]
+                )
 
                 etc = [["is_synced", False]]
                 extra_content = f"{request.user.profile.name}님에 의해 {user_profile.name}({user_profile.user.username}) 계정, 고객({customer.name}, {customer.email})연동취소"  # noqa
@@ -766,7 +719,9 @@ class MyincoAdminUserDetailView(DetailView):
                 )
             else:
                 print("연동")
+                before_user_ids = [user_profile.user_id]
                 if customer.synced_user:
+                    before_user_ids.append(customer.synced_user_id)
                     customer.synced_user.profile.is_synced = False
                     customer.synced_user.profile.save()
                 customer.synced_user = user_profile.user
@@ -774,6 +729,9 @@ class MyincoAdminUserDetailView(DetailView):
                 user_profile.is_synced = True
                 customer.save()
                 user_profile.save()
+                invalidate_related_sales_totals(
+                    customer_ids=[customer.id], user_ids=before_user_ids
+                )
 
                 etc = [["is_synced", True]]
                 if request.POST.get("method") == "recommend":
@@ -1056,7 +1014,11 @@ class MyincoAdminUserDetailView(DetailView):
                 context = self.get_context_data()
                 context["fail"] = "delete"
                 return self.render_to_response(context)
-            extra_content = f"{request.user.profile.name}님에 의해 {before_service.service_policy_price_option.get_service_code()} 계정 서비스 삭제"  # noqa
+            price_option = before_service.service_policy_price_option
+            service_code = (
+                price_option.service_code or price_option.get_service_code()
+            )
+            extra_content = f"{request.user.profile.name}님에 의해 {service_code} 계정 서비스 삭제"  # noqa
             print(before_service.__dict__)
             make_system_log(
                 before_service,
@@ -1148,7 +1110,7 @@ def user_breakaway_ajax(request):
 def open_userservice_update_modal(request, id, tab, pk):
     object_id = request.POST.get("service_id")
     user_service = UserService.objects.get(id=object_id)
-    policys = ServicePolicyPriceOption.objects.all()
+    policys = get_catalog().options
     selected_policy = user_service.service_policy_price_option
 
     try:
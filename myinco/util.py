@@ -1,3 +1,5 @@
+import json
+import difflib
 import pandas as pd
 import datetime
 from datetime import date, time
@@ -6,7 +8,8 @@ from io import BytesIO as IO
 from django.http import HttpResponse
 from isghome.models import *  # noqa
 
-from django.db import models
+from django.db import models, transaction
+from django.core.cache import cache
 from django.contrib.auth.models import User
 from django.contrib import auth
 
@@ -17,6 +20,115 @@ def excel_download(request):
     return make_df(target)
 
 
+SALES_TOTAL_KEY = "myinco:sales:{}:{}"
+# 명시적으로 삭제하지 못한 변경도 이 시간 안에는 반영
+SALES_TOTAL_TIMEOUT = 60 * 60
+
+
+def get_sales_total_key(obj):
+    return SALES_TOTAL_KEY.format(obj._meta.model_name, obj.pk)
+
+
+def get_total_sales_map(objects):
+    """
+    {pk: 총매출} 일괄 조회
+    * 캐시에 없는 항목만 total_sales() 로 계산 후 저장
+    """
+    keys = {get_sales_total_key(obj): obj for obj in objects}
+    totals = cache.get_many(list(keys))
+    missing = {
+        key: obj.total_sales()
+        for key, obj in keys.items()
+        if key not in totals
+    }
+    if missing:
+        cache.set_many(missing, SALES_TOTAL_TIMEOUT)
+        totals.update(missing)
+    return {obj.pk: totals[key] for key, obj in keys.items()}
+
+
+def attach_total_sales(page):
+    """
+    목록 페이지 객체들에 캐시된 총매출 주입
+    * 행마다 집계하지 않도록 obj.cached_total_sales 에 주입 (템플릿은 이 속성 사용)
+    * total_sales() 메서드를 가리지 않도록 별도 속성명 사용
+    """
+    page.object_list = list(page.object_list)
+    totals = get_total_sales_map(page.object_list)
+    for obj in page.object_list:
+        obj.cached_total_sales = totals[obj.pk]
+    return page
+
+
+def invalidate_sales_totals(orders):
+    """
+    결제 발행/취소 등 매출 변경 시 관련 총매출 캐시 삭제 (커밋 이후)
+    * 주문 -> 고객/계정(연동 고객 포함)/고객사는 __in 조회로 한 번에 수집
+    """
+    orders = list(orders)
+    customer_ids = {
+        order.purchaser_customer_id
+        for order in orders
+        if order.purchaser_customer_id
+    }
+    user_ids = {
+        order.purchaser_user_id for order in orders if order.purchaser_user_id
+    }
+    if user_ids:
+        customer_ids.update(
+            Customer.objects.filter(  # noqa
+                synced_user_id__in=user_ids
+            ).values_list("id", flat=True)
+        )
+    keys = [get_sales_total_key(order) for order in orders]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    invalidate_related_sales_totals(
+        customer_ids=customer_ids, user_ids=user_ids
+    )
+
+
+def invalidate_related_sales_totals(
+    customer_ids=(), user_ids=(), organization_ids=()
+):
+    """
+    고객-계정 연동, 고객사 변경 등 주문 외 변경으로 총매출이 바뀔 때 캐시 삭제
+    * 고객/계정의 현재 고객사도 함께 삭제 (이전 고객사는 organization_ids 로 전달)
+    """
+    organization_ids = {pk for pk in organization_ids if pk}
+    organization_ids.update(
+        Customer.objects.filter(  # noqa
+            id__in=customer_ids, organization__isnull=False
+        ).values_list("organization_id", flat=True)
+    )
+    keys = [SALES_TOTAL_KEY.format("customer", pk) for pk in customer_ids]
+    for profile_id, organization_id in UserProfile.objects.filter(  # noqa
+        user_id__in=user_ids
+    ).values_list("id", "organization_id"):
+        keys.append(SALES_TOTAL_KEY.format("userprofile", profile_id))
+        if organization_id:
+            organization_ids.add(organization_id)
+    keys += [
+        SALES_TOTAL_KEY.format("organization", pk) for pk in organization_ids
+    ]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def rebuild_sales_totals(batch_size=500):
+    """주문/고객/계정/고객사 총매출 캐시 전체 재계산"""
+    count = 0
+    for model in (Order, Customer, UserProfile, Organization):  # noqa
+        totals = {}
+        for obj in model.objects.all().iterator(chunk_size=batch_size):
+            totals[get_sales_total_key(obj)] = obj.total_sales()
+            if len(totals) >= batch_size:
+                cache.set_many(totals, SALES_TOTAL_TIMEOUT)
+                count += len(totals)
+                totals = {}
+        cache.set_many(totals, SALES_TOTAL_TIMEOUT)
+        count += len(totals)
+    return count
+
+
 def make_df(target):
     if target == "order":
         col_names = [
@@ -30,6 +142,8 @@ def make_df(target):
             "생성일",
         ]
 
+        orders = list(Order.objects.all())  # noqa
+        sales = get_total_sales_map(orders)
         rows = [
             (
                 order.identifier,
@@ -54,10 +168,10 @@ def make_df(target):
                 + order.purchaser_user.profile.get_grade_display(),
                 order.get_status_display(),
                 order.get_payment_method_display(),
-                order.total_sales(),
+                sales[order.pk],
                 order.get_ctime(),
             )
-            for order in Order.objects.all()  # noqa
+            for order in orders
         ]
         df = pd.DataFrame(columns=col_names, data=rows)
     elif target == "customer":
@@ -73,6 +187,8 @@ def make_df(target):
             "생성일",
         ]
 
+        customers = list(Customer.objects.all())  # noqa
+        sales = get_total_sales_map(customers)
         rows = [
             (
                 customer.name,
@@ -97,10 +213,10 @@ def make_df(target):
                         )
                     )
                 ),
-                customer.total_sales(),
+                sales[customer.pk],
                 customer.get_ctime(),
             )
-            for customer in Customer.objects.all()  # noqa
+            for customer in customers
         ]
         df = pd.DataFrame(columns=col_names, data=rows)
     elif target == "user":
@@ -116,6 +232,8 @@ def make_df(target):
             "생성일",
         ]
 
+        profiles = list(UserProfile.objects.all())  # noqa
+        sales = get_total_sales_map(profiles)
         rows = [
             (
                 profile.user.username,
@@ -134,10 +252,10 @@ def make_df(target):
                     ]
                 ),
                 "O" if profile.user.synced_user.first() is not None else "X",
-                profile.total_sales(),
+                sales[profile.pk],
                 profile.get_ctime(),
             )
-            for profile in UserProfile.objects.all()  # noqa
+            for profile in profiles
         ]
         df = pd.DataFrame(columns=col_names, data=rows)
     elif target == "organization":
@@ -151,6 +269,8 @@ def make_df(target):
             "생성일",
         ]
 
+        organizations = list(Organization.objects.all())  # noqa
+        sales = get_total_sales_map(organizations)
         rows = [
             (
                 organization.place_name,
@@ -164,10 +284,10 @@ def make_df(target):
                         )
                     )
                 ),
-                organization.total_sales(),
+                sales[organization.pk],
                 organization.get_ctime(),
             )
-            for organization in Organization.objects.all()  # noqa
+            for organization in organizations
         ]
         df = pd.DataFrame(columns=col_names, data=rows)
     elif target == "auth_group":
@@ -280,7 +400,106 @@ make_system_log(
 
 
 # 로그 기록 제외 필드
-exclude_dict = {"Quotation": ["context", "remarks"]}
+exclude_dict = {}
+
+# 행 단위 변경분(delta)으로 기록하는 시트 필드
+sheet_dict = {"Quotation": ["context", "remarks"]}
+# 시트 행 순번 컬럼
+SHEET_SEQUENCE_KEY = "연번"
+
+
+def get_sheet_rows(sheet):
+    """
+    시트 값을 행 목록으로 변환
+    * {"data": [...]} / [...] / JSON 문자열 모두 허용
+    """
+    if isinstance(sheet, str):
+        try:
+            sheet = json.loads(sheet)
+        except ValueError:
+            return [sheet]
+    if isinstance(sheet, dict):
+        sheet = sheet.get("data", [])
+    return list(sheet or [])
+
+
+def get_sheet_row_key(row):
+    """행 비교 키 (연번은 행 추가/삭제 시 다시 매겨지므로 제외)"""
+    if isinstance(row, dict):
+        row = {
+            key: value for key, value in row.items() if key != SHEET_SEQUENCE_KEY
+        }
+    return json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def make_sheet_delta(before, value):
+    """
+    두 시트의 행 단위 변경분
+    * 연번을 제외한 행 내용으로 두 시트의 행을 맞춘 뒤 달라진 구간만 기록
+      (중간에 행을 추가/삭제해도 뒤쪽 행은 변경으로 보지 않음)
+    * {"hunks": [{"at": 변경 후 시작 위치, "before": [이전 행], "value": [변경 행]}],
+       "renumber": {변경 후 위치: 이전 연번}}
+    """
+    before_rows = get_sheet_rows(before)
+    value_rows = get_sheet_rows(value)
+    matcher = difflib.SequenceMatcher(
+        None,
+        [get_sheet_row_key(row) for row in before_rows],
+        [get_sheet_row_key(row) for row in value_rows],
+        autojunk=False,
+    )
+    delta = {"hunks": [], "renumber": {}}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            delta["hunks"].append(
+                {
+                    "at": j1,
+                    "before": before_rows[i1:i2],
+                    "value": value_rows[j1:j2],
+                }
+            )
+            continue
+        for i, j in zip(range(i1, i2), range(j1, j2)):
+            if before_rows[i] != value_rows[j]:
+                delta["renumber"][str(j)] = before_rows[i].get(
+                    SHEET_SEQUENCE_KEY
+                )
+    if delta["hunks"] or delta["renumber"]:
+        return delta
+    return None
+
+
+def revert_sheet_delta(rows, delta):
+    """변경 후 행 목록에 delta 를 되돌려 변경 전 행 목록 반환"""
+    if "hunks" not in delta:
+        # 이전 형식 (행 번호 기준)
+        rows = dict(enumerate(rows))
+        for i, row in delta["before"].items():
+            rows[int(i)] = row
+        return [rows[i] for i in sorted(rows) if rows[i] is not None]
+
+    rows = list(rows)
+    for j, sequence in delta["renumber"].items():
+        rows[int(j)] = dict(rows[int(j)], **{SHEET_SEQUENCE_KEY: sequence})
+    for hunk in reversed(delta["hunks"]):
+        at = hunk["at"]
+        rows[at:at + len(hunk["value"])] = hunk["before"]
+    return rows
+
+
+def get_sheet_section(sheet, rows):
+    """
+    시트 조회 응답 형식 {"data": 행 목록, ...}
+    * dict 시트는 data 외 다른 키도 그대로 포함
+    """
+    if isinstance(sheet, str):
+        try:
+            sheet = json.loads(sheet)
+        except ValueError:
+            sheet = None
+    section = dict(sheet) if isinstance(sheet, dict) else {}
+    section["data"] = rows
+    return section
 
 
 def make_system_log(
@@ -348,6 +567,12 @@ def make_system_log(
             # 로그 기록 제외 필드 건너뛰기
             if model_name in exclude_dict and key in exclude_dict[model_name]:
                 continue
+            # 시트 필드는 변경된 행만 기록
+            if model_name in sheet_dict and key in sheet_dict[model_name]:
+                delta = make_sheet_delta(getattr(model_object, key), value)
+                if delta:
+                    changed_dict[key] = delta
+                continue
             try:
                 # 변경된 필드값이 many to many field일 경우
                 if isinstance(
@@ -452,6 +677,36 @@ def make_system_log(
         ).save_with_url(extra_url)
 
 
+def complete_system_log(
+    model_object,
+    page_name,
+    url,
+    user,
+    method,
+    identifier=None,
+    extra_content=None,
+    default_log=None,
+    extra_url=None,
+):
+    """
+    변경 사항 없이 끝난 요청의 default_log 를 정상(200)으로 기록
+    * 중복 요청, 같은 값 저장 등 (status_code 500 으로 남지 않도록)
+    """
+    if default_log is None:
+        return
+    SystemLog(  # noqa
+        id=default_log.id,
+        model=model_object._meta.model.__name__,
+        model_identifier=identifier,
+        page_name=page_name,
+        url=url,
+        method=method,
+        user=user,
+        extra_content=extra_content or f"{page_name} 변경 사항 없음",
+        status_code="200",
+    ).save_with_url(extra_url)
+
+
 # model_object,
 # page_name,
 # url,